@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+GUI startup import-time benchmark.
+
+Imports book_generator_gui in fresh interpreters and reports the median
+time. Fails (exit 1) if the median is over budget or if any module that the
+GUI should only load on demand was imported at startup:
+
+    python benchmarks/import_time.py [--runs N] [--budget-ms MS]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Deferred until first generation, cover upload, font or batch action
+DEFERRED = ("PIL", "numpy", "pypdf", "reportlab.pdfgen", "reportlab.platypus",
+            "reportlab.pdfbase.ttfonts", "kdp.render", "kdp.covers", "kdp.fonts", "kdp.batch",
+            "kdp.spine", "kdp.isbn", "kdp.wrap", "kdp.build", "kdp.metrics")
+DEFAULT_BUDGET_MS = 150
+
+_PROBE = ("import sys, time\n"
+          "start = time.perf_counter()\n"
+          "import book_generator_gui\n"
+          "print(time.perf_counter() - start)\n"
+          "print(' '.join(sys.modules))\n")
+
+
+def measure(runs):
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    times, modules = [], set()
+    # The GUI configures a log file on import; keep it out of the tree
+    with tempfile.TemporaryDirectory() as cwd:
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, "-c", _PROBE], cwd=cwd, env=env,
+                                 capture_output=True, text=True, check=True).stdout.splitlines()
+            times.append(float(out[0]))
+            modules.update(out[1].split())
+    return times, modules
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    runs, budget = 5, DEFAULT_BUDGET_MS
+    if "--runs" in argv:
+        runs = int(argv[argv.index("--runs") + 1])
+    if "--budget-ms" in argv:
+        budget = float(argv[argv.index("--budget-ms") + 1])
+
+    times, modules = measure(runs)
+    median = statistics.median(times) * 1000
+    print(f"import book_generator_gui: median {median:.0f} ms, "
+          f"min {min(times) * 1000:.0f} ms over {runs} runs (budget {budget:.0f} ms)")
+
+    eager = [d for d in DEFERRED if any(m == d or m.startswith(d + ".") for m in modules)]
+    if eager:
+        print("imported at startup but should be deferred: " + ", ".join(eager))
+    return 1 if eager or median > budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
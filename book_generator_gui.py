@@ -8,19 +8,17 @@ v3.0 - Enterprise-Grade Book Generator with Preflight Checks, CMYK Support, and
 import os
 import json
 import logging
+import queue
 import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from PIL import Image
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.units import inch, mm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.pagesizes import LETTER, A4
-from reportlab.pdfbase.pdfmetrics import registerFontFamily
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph
+from reportlab.lib.units import inch
+
+# Only light modules at import time; PIL, NumPy, the reportlab canvas and
+# pypdf are imported by the methods that need them so the window opens fast
+from kdp.config import (BUNDLED_FONTS, BookConfig, DEFAULT_COVER_FONT, DEFAULT_INTERIOR,
+                        DEFAULT_TRIM, INTERIORS, ORIENTATIONS, TRIM_SIZES)
+from kdp.progress import CANCELLED, DONE, FAILED, PROGRESS, ProgressChannel, RenderCancelled
 
 # Configure logging
 logging.basicConfig(
@@ -34,10 +32,14 @@ class KDPPublisher:
         self.root = root
         self.root.title("KDP Professional Publishing Suite v3.0")
         self.root.geometry("1200x800")
-        self.setup_ui()
         self.running = False
         self.bleed = 0.125 * inch  # KDP required bleed
         self.current_project = {}
+        self.cover_path = ""
+        self.cmyk_profile = ""
+        self.font_paths = {}
+        self.setup_variables()
+        self.setup_ui()
         self.setup_menus()
         
     def setup_menus(self):
@@ -54,34 +56,65 @@ class KDPPublisher:
         
         # Tools Menu
         tools_menu = tk.Menu(menubar, tearoff=0)
-        tools_menu.add_command(label="Batch Processor")
-        tools_menu.add_command(label="ISBN Generator")
-        tools_menu.add_command(label="Spine Calculator")
+        tools_menu.add_command(label="Batch Processor", command=self.open_batch_processor)
+        tools_menu.add_command(label="ISBN Generator", command=self.open_isbn_generator)
+        tools_menu.add_command(label="Spine Calculator", command=self.open_spine_calculator)
         
         menubar.add_cascade(label="File", menu=file_menu)
         menubar.add_cascade(label="Tools", menu=tools_menu)
         self.root.config(menu=menubar)
 
+    def setup_variables(self):
+        # Settings live in Tk variables so they can be read before the tab
+        # that edits them has been built
+        self.page_style = tk.StringVar(value="lined")
+        self.line_spacing = tk.StringVar(value="0.25")
+        for pos in ("top", "bottom", "left", "right"):
+            setattr(self, f"margin_{pos}", tk.StringVar(value="0.5"))
+        self.color_mode = tk.StringVar(value="RGB")
+        self.page_count = tk.StringVar(value="100")
+        self.interior = tk.StringVar(value=INTERIORS[DEFAULT_INTERIOR][0])  # label shown
+        self.cover_font = tk.StringVar(value=DEFAULT_COVER_FONT)
+        self.preflight_status = tk.StringVar(value="Preflight Checks: 0/4 Passed")
+
     def setup_ui(self):
         # Notebook with Tabs
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill=tk.BOTH, expand=True)
 
-        # Setup Tabs
-        self.setup_design_tab()
-        self.setup_layout_tab()
-        self.setup_advanced_tab()
-        self.setup_preflight_tab()
+        # Tabs are empty frames until first selected
+        self.pending_tabs = {}
+        for text, builder in (("Design", self.setup_design_tab),
+                              ("Layout", self.setup_layout_tab),
+                              ("Advanced", self.setup_advanced_tab),
+                              ("Preflight", self.setup_preflight_tab)):
+            frame = ttk.Frame(self.notebook)
+            self.notebook.add(frame, text=text)
+            self.pending_tabs[str(frame)] = (builder, frame)
+        self.notebook.bind("<<NotebookTabChanged>>", self.build_selected_tab)
+        self.build_selected_tab()
         
         # Status Bar
         self.status = ttk.Label(self.root, text="Ready", relief=tk.SUNKEN)
         self.status.pack(side=tk.BOTTOM, fill=tk.X)
 
-    def setup_design_tab(self):
+        # Generation Controls
+        controls = ttk.Frame(self.root)
+        controls.pack(side=tk.BOTTOM, fill=tk.X)
+        ttk.Button(controls, text="Generate PDF", command=self.generate_pdf).pack(side=tk.LEFT, padx=5, pady=2)
+        self.progress_bar = ttk.Progressbar(controls, mode="determinate")
+        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.cancel_button = ttk.Button(controls, text="Cancel", command=self.cancel_generation,
+                                        state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+
+    def build_selected_tab(self, event=None):
+        builder, frame = self.pending_tabs.pop(self.notebook.select(), (None, None))
+        if builder:
+            builder(frame)
+
+    def setup_design_tab(self, frame):
         # Design Tab Content
-        frame = ttk.Frame(self.notebook)
-        self.notebook.add(frame, text="Design")
-
         # Project Settings
         ttk.Label(frame, text="Title:").grid(row=0, column=0, padx=5, pady=2)
         self.title_entry = ttk.Entry(frame, width=40)
@@ -93,22 +126,31 @@ class KDPPublisher:
         self.author_entry.grid(row=1, column=1, sticky=tk.W)
 
         ttk.Label(frame, text="ISBN:").grid(row=1, column=2, padx=5, pady=2)
-        self.isbn_entry = ttk.Entry(frame, width=15)
+        self.isbn_entry = ttk.Entry(frame, width=18)
         self.isbn_entry.grid(row=1, column=3, sticky=tk.W)
+        self.isbn_entry.bind("<FocusOut>", self.validate_isbn_entry)
 
         # Page Configuration
         page_frame = ttk.LabelFrame(frame, text="Page Configuration")
         page_frame.grid(row=2, column=0, columnspan=4, sticky=tk.EW, padx=5, pady=5)
 
         ttk.Label(page_frame, text="Size:").grid(row=0, column=0)
-        self.page_size = ttk.Combobox(page_frame, values=["6x9", "8.5x11", "A4", "Custom"])
+        self.page_size = ttk.Combobox(page_frame, values=list(TRIM_SIZES), state="readonly")
         self.page_size.grid(row=0, column=1)
         self.page_size.bind("<<ComboboxSelected>>", self.update_page_size)
 
         ttk.Label(page_frame, text="Orientation:").grid(row=0, column=2)
-        self.orientation = ttk.Combobox(page_frame, values=["Portrait", "Landscape"])
+        self.orientation = ttk.Combobox(page_frame, values=list(ORIENTATIONS), state="readonly")
         self.orientation.grid(row=0, column=3)
 
+        ttk.Label(page_frame, text="Pages:").grid(row=1, column=0)
+        ttk.Spinbox(page_frame, from_=24, to=828, increment=2,
+                    textvariable=self.page_count).grid(row=1, column=1)
+
+        ttk.Label(page_frame, text="Interior:").grid(row=1, column=2)
+        ttk.Combobox(page_frame, values=[label for label, _ in INTERIORS.values()],
+                     textvariable=self.interior, state="readonly", width=28).grid(row=1, column=3)
+
         # Cover Design
         cover_frame = ttk.LabelFrame(frame, text="Cover Design")
         cover_frame.grid(row=3, column=0, columnspan=4, sticky=tk.EW, padx=5, pady=5)
@@ -117,16 +159,19 @@ class KDPPublisher:
         self.cover_preview = ttk.Label(cover_frame, text="No Cover Selected")
         self.cover_preview.grid(row=0, column=1)
 
-    def setup_layout_tab(self):
-        # Layout Tab Content
-        frame = ttk.Frame(self.notebook)
-        self.notebook.add(frame, text="Layout")
+        ttk.Label(cover_frame, text="Cover Font:").grid(row=1, column=0)
+        # Added fonts show up the next time the list opens
+        cover_font = ttk.Combobox(cover_frame, textvariable=self.cover_font, state="readonly")
+        cover_font.config(postcommand=lambda: cover_font.config(
+            values=list(BUNDLED_FONTS) + list(self.font_paths)))
+        cover_font.grid(row=1, column=1)
 
+    def setup_layout_tab(self, frame):
+        # Layout Tab Content
         # Page Styles
         style_frame = ttk.LabelFrame(frame, text="Page Style")
         style_frame.grid(row=0, column=0, padx=5, pady=5, sticky=tk.N)
 
-        self.page_style = tk.StringVar(value="lined")
         styles = [("Lined", "lined"), ("Dotted", "dotted"), 
                  ("Grid", "grid"), ("Blank", "blank")]
         for text, mode in styles:
@@ -138,45 +183,42 @@ class KDPPublisher:
         spacing_frame.grid(row=0, column=1, padx=5, pady=5, sticky=tk.N)
 
         ttk.Label(spacing_frame, text="Line Spacing:").grid(row=0, column=0)
-        self.line_spacing = ttk.Spinbox(spacing_frame, from_=0.1, to=1.0, increment=0.05)
-        self.line_spacing.grid(row=0, column=1)
-        self.line_spacing.set(0.25)
+        ttk.Spinbox(spacing_frame, from_=0.1, to=1.0, increment=0.05,
+                    textvariable=self.line_spacing).grid(row=0, column=1)
 
         # Margins
         margin_controls = ["Top", "Bottom", "Left", "Right"]
         for i, pos in enumerate(margin_controls):
             ttk.Label(spacing_frame, text=f"{pos} Margin:").grid(row=i+1, column=0)
-            entry = ttk.Spinbox(spacing_frame, from_=0.1, to=3.0, increment=0.1)
+            entry = ttk.Spinbox(spacing_frame, from_=0.1, to=3.0, increment=0.1,
+                                textvariable=getattr(self, f"margin_{pos.lower()}"))
             entry.grid(row=i+1, column=1)
-            entry.set(0.5)
-            setattr(self, f"margin_{pos.lower()}", entry)
 
-    def setup_advanced_tab(self):
+    def setup_advanced_tab(self, frame):
         # Advanced Tab Content
-        frame = ttk.Frame(self.notebook)
-        self.notebook.add(frame, text="Advanced")
-
         # Color Management
         color_frame = ttk.LabelFrame(frame, text="Color Settings")
         color_frame.grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
 
-        self.color_mode = tk.StringVar(value="RGB")
         ttk.Radiobutton(color_frame, text="RGB", variable=self.color_mode, value="RGB").pack(anchor=tk.W)
         ttk.Radiobutton(color_frame, text="CMYK", variable=self.color_mode, value="CMYK").pack(anchor=tk.W)
+        ttk.Button(color_frame, text="CMYK Output Profile", command=self.choose_cmyk_profile).pack(anchor=tk.W)
+        self.cmyk_profile_label = ttk.Label(
+            color_frame, text=os.path.basename(self.cmyk_profile) or "No ICC Profile")
+        self.cmyk_profile_label.pack(anchor=tk.W)
 
         # Font Management
         font_frame = ttk.LabelFrame(frame, text="Font Settings")
         font_frame.grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
 
         ttk.Button(font_frame, text="Add Font", command=self.add_font).pack()
+        ttk.Button(font_frame, text="Add Font Folder", command=self.add_font_dir).pack()
         self.font_list = tk.Listbox(font_frame, height=4)
         self.font_list.pack()
+        self.font_list.insert(tk.END, *self.font_paths)
 
-    def setup_preflight_tab(self):
+    def setup_preflight_tab(self, frame):
         # Preflight Checks Tab
-        frame = ttk.Frame(self.notebook)
-        self.notebook.add(frame, text="Preflight")
-
         checks = [
             ("Bleed Area (0.125\")", self.check_bleed),
             ("Minimum Resolution (300 DPI)", self.check_resolution),
@@ -188,27 +230,50 @@ class KDPPublisher:
             chk = ttk.Checkbutton(frame, text=text, command=func)
             chk.grid(row=i, column=0, sticky=tk.W)
 
-        self.preflight_status = ttk.Label(frame, text="Preflight Checks: 0/4 Passed")
-        self.preflight_status.grid(row=len(checks), column=0, sticky=tk.W)
+        ttk.Label(frame, textvariable=self.preflight_status).grid(row=len(checks), column=0, sticky=tk.W)
+        ttk.Button(frame, text="Check Output PDF", command=self.preflight_output).grid(
+            row=len(checks) + 1, column=0, sticky=tk.W, pady=5)
 
     def upload_cover(self):
         filetypes = [("Image Files", "*.jpg *.jpeg *.png *.tif")]
         path = filedialog.askopenfilename(filetypes=filetypes)
         if path:
             self.validate_cover(path)
+            self.cover_path = path
             self.cover_preview.config(text=os.path.basename(path))
 
     def validate_cover(self, path):
+        from kdp.assets import inspect_image
+        from kdp.covers import PRINT_DPI, effective_dpi
+
         try:
-            with Image.open(path) as img:
-                if img.mode != "CMYK":
-                    self.status.config(text="Warning: Cover not in CMYK mode")
-                if img.info.get('dpi', (300, 300))[0] < 300:
-                    self.status.config(text="Warning: Cover resolution under 300 DPI")
+            # Header-only: the pixels are never decoded just to validate
+            info = inspect_image(path)
+            dpi = min(effective_dpi(path, self.snapshot_config()))
+            logging.info(f"Cover {os.path.basename(path)}: {info.width}x{info.height} px, "
+                         f"{info.mode}, effective {dpi:.0f} DPI")
+            if info.mode != "CMYK":
+                self.status.config(text="Warning: Cover not in CMYK mode")
+            if dpi < PRINT_DPI:
+                self.status.config(text=f"Warning: Cover prints at {dpi:.0f} DPI "
+                                        f"(minimum {PRINT_DPI}) at this trim size")
         except Exception as e:
             logging.error(f"Cover validation failed: {str(e)}")
             messagebox.showerror("Invalid Cover", str(e))
 
+    def choose_cmyk_profile(self):
+        path = filedialog.askopenfilename(filetypes=[("ICC Profiles", "*.icc *.icm")])
+        if path:
+            try:
+                from kdp.color import validate_cmyk_profile
+
+                validate_cmyk_profile(path)
+                self.cmyk_profile = path
+                self.cmyk_profile_label.config(text=os.path.basename(path))
+            except Exception as e:
+                logging.error(f"ICC profile load failed: {str(e)}")
+                messagebox.showerror("Invalid Profile", str(e))
+
     def run_preflight(self):
         checks = [
             self.check_bleed(),
@@ -217,33 +282,143 @@ class KDPPublisher:
             self.check_fonts()
         ]
         passed = sum(checks)
-        self.preflight_status.config(text=f"Preflight Checks: {passed}/4 Passed")
+        self.preflight_status.set(f"Preflight Checks: {passed}/4 Passed")
         return all(checks)
 
+    def preflight_output(self):
+        path = filedialog.askopenfilename(filetypes=[("PDF Files", "*.pdf")])
+        if not path:
+            return
+        try:
+            from kdp.preflight import preflight_pdf  # needs pypdf
+            config = self.snapshot_config()
+        except (ImportError, ValueError) as e:
+            messagebox.showerror("Preflight Unavailable", str(e))
+            return
+
+        results = queue.Queue()
+
+        def work():
+            try:
+                results.put(preflight_pdf(path, config))
+            except Exception as e:
+                logging.error(f"Output preflight failed: {str(e)}")
+                results.put(e)
+
+        threading.Thread(target=work, daemon=True).start()
+        self.status.config(text=f"Checking {os.path.basename(path)}...")
+        self.root.after(100, self.poll_preflight, results)
+
+    def poll_preflight(self, results):
+        try:
+            report = results.get_nowait()
+        except queue.Empty:
+            self.root.after(100, self.poll_preflight, results)
+            return
+        if isinstance(report, Exception):
+            self.status.config(text="Output preflight failed")
+            messagebox.showerror("Preflight Error", str(report))
+            return
+        issues = report.summary()
+        self.status.config(text=f"Output preflight: {len(report.pages)} pages, {len(issues)} issues")
+        if issues:
+            self.show_preflight_issues(issues)
+        else:
+            messagebox.showinfo("Preflight Passed", "Output PDF meets KDP print requirements")
+
+    def show_preflight_issues(self, issues):
+        shown = "\n".join(issues[:20])
+        if len(issues) > 20:
+            shown += f"\n... and {len(issues) - 20} more"
+        messagebox.showwarning("Preflight Issues", shown)
+
     def check_bleed(self):
-        # Implement actual bleed check
-        return True
+        # The bleed itself is fixed at KDP's 0.125"; the cover art has to fill
+        # its bleed box without more than a sliver being cropped off
+        if not self.cover_path:
+            return True
+        from kdp.covers import CROP_WARN_FRACTION, crop_fraction
+
+        try:
+            return crop_fraction(self.cover_path, self.snapshot_config()) <= CROP_WARN_FRACTION
+        except (OSError, ValueError) as e:
+            logging.error(f"Bleed check failed: {str(e)}")
+            return False
 
     def check_resolution(self):
-        return True
+        # Effective DPI of the cover over trim plus bleed, from its header
+        if not self.cover_path:
+            return True
+        from kdp.covers import PRINT_DPI, effective_dpi
+
+        try:
+            return min(effective_dpi(self.cover_path, self.snapshot_config())) >= PRINT_DPI
+        except (OSError, ValueError) as e:
+            logging.error(f"Resolution check failed: {str(e)}")
+            return False
 
     def check_color_mode(self):
         return self.color_mode.get() == "CMYK"
 
     def check_fonts(self):
-        return self.font_list.size() > 0
+        return bool(self.font_paths)
 
     def add_font(self):
         path = filedialog.askopenfilename(filetypes=[("Font Files", "*.ttf *.otf")])
         if path:
             try:
+                from kdp.fonts import check_font_file, declare_font
+
                 font_name = os.path.splitext(os.path.basename(path))[0]
-                pdfmetrics.registerFont(TTFont(font_name, path))
+                check_font_file(path)
+                declare_font(font_name, path)  # parsed on first use, then from the font cache
+                self.font_paths[font_name] = path
                 self.font_list.insert(tk.END, font_name)
             except Exception as e:
                 logging.error(f"Font registration failed: {str(e)}")
                 messagebox.showerror("Font Error", str(e))
 
+    def add_font_dir(self):
+        directory = filedialog.askdirectory(title="Font Folder")
+        if not directory:
+            return
+        results = queue.Queue()
+
+        def work():
+            # Parsing runs in a process pool; only the index comes back here
+            try:
+                from kdp.fonts import register_font_dir
+
+                results.put(register_font_dir(directory))
+            except Exception as e:
+                logging.error(f"Font folder registration failed: {str(e)}")
+                results.put(e)
+
+        threading.Thread(target=work, daemon=True).start()
+        self.status.config(text=f"Loading fonts from {os.path.basename(directory)}...")
+        self.root.after(100, self.poll_font_dir, results)
+
+    def poll_font_dir(self, results):
+        try:
+            result = results.get_nowait()
+        except queue.Empty:
+            self.root.after(100, self.poll_font_dir, results)
+            return
+        if isinstance(result, Exception):
+            self.status.config(text="Font folder could not be loaded")
+            messagebox.showerror("Font Error", str(result))
+            return
+        entries, errors = result
+        for entry in entries:
+            if entry.name not in self.font_paths:
+                self.font_list.insert(tk.END, entry.name)
+            self.font_paths[entry.name] = entry.path
+        for path, error in errors.items():
+            logging.warning(f"Skipped font {path}: {error}")
+        families = len({entry.family for entry in entries})
+        self.status.config(text=f"Loaded {len(entries)} fonts in {families} families"
+                                + (f", {len(errors)} skipped" if errors else ""))
+
     def generate_pdf(self):
         if self.running:
             return
@@ -251,42 +426,302 @@ class KDPPublisher:
             messagebox.showwarning("Preflight Failed", "Fix issues before generating PDF")
             return
 
+        # Read every widget here on the main thread; Tk is not thread-safe
+        try:
+            from kdp.isbn import normalize
+            from kdp.metrics import Metrics
+            from kdp.spine import check_page_count
+
+            metrics = Metrics()
+            with metrics.stage("config_snapshot"):
+                config = self.snapshot_config()
+            check_page_count(config)
+            if config.isbn:
+                normalize(config.isbn)
+        except ValueError as e:
+            messagebox.showerror("Invalid Settings", str(e))
+            return
+
         self.running = True
-        thread = threading.Thread(target=self._generate_pdf)
+        self.build_reports = []
+        self.render_progress = ProgressChannel()
+        self.progress_bar.config(value=0, maximum=max(config.page_count, 1))
+        self.cancel_button.config(state=tk.NORMAL)
+        thread = threading.Thread(target=self._generate_pdf,
+                                  args=(config, self.render_progress, metrics), daemon=True)
         thread.start()
+        self.root.after(100, self.poll_progress)
 
-    def _generate_pdf(self):
+    def _generate_pdf(self, config, progress, metrics=None):
+        # Runs on the worker thread: report through the channel, never call Tk
         try:
-            c = canvas.Canvas("output.pdf", pagesize=self.get_page_size())
-            self.draw_cover(c)
-            for page in range(self.get_page_count()):
-                if not self.running:
-                    break
-                self.draw_page(c, page)
-                c.showPage()
-            c.save()
-            messagebox.showinfo("Success", "PDF Generated Successfully")
+            from importlib.util import find_spec
+
+            from kdp.build import build_book
+
+            preflight = find_spec("pypdf") is not None
+            if not preflight:
+                logging.warning("pypdf is not installed; output preflight skipped")
+            # Only the parts whose inputs changed since the last build are rendered
+            result = build_book(config, "output.pdf", "output_cover.pdf", preflight=preflight,
+                                progress=progress, metrics=metrics)
+            if metrics:
+                # One machine-readable line per build; see kdp.metrics for the fields
+                logging.info(f"Build metrics: {metrics.to_json()}")
+            # Read by poll_progress once the DONE event below arrives
+            self.build_reports = [report for report in (result.report, result.cover_report)
+                                  if report is not None]
+            progress.finish(result.summary())
+        except RenderCancelled:
+            progress.acknowledge_cancel()
         except Exception as e:
             logging.error(f"Generation failed: {str(e)}")
-            messagebox.showerror("Error", str(e))
-        finally:
-            self.running = False
-
-    def draw_cover(self, c):
-        # Implement cover drawing with bleed
-        pass
-
-    def draw_page(self, c, page_num):
-        # Implement page drawing logic
-        pass
+            progress.fail(str(e))
+
+    def poll_progress(self):
+        # Drain renderer events on the Tk main loop
+        for event in self.render_progress.drain():
+            if event.kind == PROGRESS:
+                self.progress_bar.config(value=event.page)
+                self.status.config(text=f"Page {event.page}/{event.total} - "
+                                        f"{event.rate:.0f} pages/s - ETA {event.eta:.1f}s")
+            elif event.kind == DONE:
+                self.finish_generation(f"PDFs ready in {event.elapsed:.1f}s: {event.message}")
+                issues = [f"{report.path}: {line}" for report in self.build_reports
+                          for line in report.summary()]
+                if issues:
+                    self.preflight_status.set(f"Output preflight: {len(issues)} issues")
+                    self.show_preflight_issues(issues)
+                else:
+                    messagebox.showinfo("Success", "Interior and cover PDFs generated "
+                                                   "(output.pdf, output_cover.pdf)")
+                return
+            elif event.kind == CANCELLED:
+                self.finish_generation("Generation cancelled")
+                return
+            elif event.kind == FAILED:
+                self.finish_generation("Generation failed")
+                messagebox.showerror("Error", event.message)
+                return
+        self.root.after(100, self.poll_progress)
+
+    def finish_generation(self, text):
+        self.running = False
+        self.cancel_button.config(state=tk.DISABLED)
+        timings = ", ".join(f"{name} {t:.2f}s" for name, t in self.render_progress.stage_times.items())
+        if timings:
+            text = f"{text} ({timings})"
+            logging.info(f"Stage timings: {timings}")
+        self.status.config(text=text)
+
+    def cancel_generation(self):
+        if self.running:
+            self.render_progress.cancel()
+            self.status.config(text="Cancelling...")
+
+    def snapshot_config(self):
+        # Collect the widget values into an immutable spec for the renderer
+        return BookConfig(
+            title=self.title_entry.get(),
+            author=self.author_entry.get(),
+            isbn=self.isbn_entry.get(),
+            trim_size=self.page_size.get() or DEFAULT_TRIM,
+            orientation=self.orientation.get() or "Portrait",
+            page_style=self.page_style.get(),
+            line_spacing=float(self.line_spacing.get()),
+            margin_top=float(self.margin_top.get()),
+            margin_bottom=float(self.margin_bottom.get()),
+            margin_left=float(self.margin_left.get()),
+            margin_right=float(self.margin_right.get()),
+            bleed=self.bleed / inch,
+            color_mode=self.color_mode.get(),
+            cmyk_profile=self.cmyk_profile,
+            page_count=self.get_page_count(),
+            interior=next(name for name, (label, _) in INTERIORS.items()
+                          if label == self.interior.get()),
+            cover_path=self.cover_path,
+            fonts=tuple(self.font_paths.items()),
+            cover_font=self.cover_font.get(),
+        )
 
     def get_page_size(self):
         # Calculate page size with bleed
-        return LETTER
+        return self.snapshot_config().page_size
 
     def get_page_count(self):
-        # Get validated page count
-        return 100
+        # Get validated page count; limits for the trim and interior are
+        # checked by kdp.spine before generation
+        value = self.page_count.get()
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"Page count must be a whole number, not {value!r}") from None
+
+    def open_spine_calculator(self):
+        from kdp.spine import SPINE_TEXT_MIN_PAGES, check_page_count, cover_size, spine_width
+
+        window = tk.Toplevel(self.root)
+        window.title("Spine Calculator")
+        # Edits the book's own page count and interior, so the result carries over
+        ttk.Label(window, text="Pages:").grid(row=0, column=0, padx=5, pady=2, sticky=tk.W)
+        ttk.Spinbox(window, from_=24, to=828, increment=2,
+                    textvariable=self.page_count).grid(row=0, column=1, sticky=tk.W)
+        ttk.Label(window, text="Interior:").grid(row=1, column=0, padx=5, pady=2, sticky=tk.W)
+        ttk.Combobox(window, values=[label for label, _ in INTERIORS.values()],
+                     textvariable=self.interior, state="readonly", width=28).grid(row=1, column=1)
+        result = ttk.Label(window, justify=tk.LEFT)
+        result.grid(row=2, column=0, columnspan=2, padx=5, pady=5, sticky=tk.W)
+
+        def refresh(*args):
+            try:
+                config = self.snapshot_config()
+            except ValueError as e:
+                result.config(text=str(e))
+                return
+            width, height = cover_size(config)
+            lines = [f"Trim: {config.trim_size} {config.orientation}",
+                     f"Spine width: {spine_width(config):.3f} in",
+                     f"Full cover with bleed: {width:.3f} x {height:.3f} in"]
+            try:
+                low, high = check_page_count(config)
+                lines.append(f"Allowed pages: {low}-{high}")
+            except ValueError as e:
+                lines.append(str(e))
+            if config.page_count < SPINE_TEXT_MIN_PAGES:
+                lines.append(f"No spine text below {SPINE_TEXT_MIN_PAGES} pages")
+            result.config(text="\n".join(lines))
+
+        traces = [(var, var.trace_add("write", refresh)) for var in (self.page_count, self.interior)]
+
+        def untrace(event):
+            if event.widget is window:
+                for var, trace in traces:
+                    var.trace_remove("write", trace)
+
+        window.bind("<Destroy>", untrace)
+        refresh()
+
+    def validate_isbn_entry(self, event=None):
+        value = self.isbn_entry.get().strip()
+        if not value:
+            return True
+        from kdp.isbn import hyphenate, normalize
+
+        try:
+            code = normalize(value)
+            isbn = hyphenate([code])[0]
+        except ValueError as e:
+            self.status.config(text=str(e))
+            return False
+        # ISBN-10s become ISBN-13s; an ISBN-13 as typed is only replaced by an
+        # exact hyphenation from the range data
+        typed_isbn13 = value.replace("-", "").replace(" ", "") == code
+        if isbn != code or not typed_isbn13:
+            self.isbn_entry.delete(0, tk.END)
+            self.isbn_entry.insert(0, isbn)
+        return True
+
+    def open_isbn_generator(self):
+        from kdp.isbn import hyphenate, isbn_block
+
+        window = tk.Toplevel(self.root)
+        window.title("ISBN Generator")
+        ttk.Label(window, text="Block prefix:").grid(row=0, column=0, padx=5, pady=2, sticky=tk.W)
+        prefix = ttk.Entry(window, width=20)
+        prefix.grid(row=0, column=1, sticky=tk.W)
+        ttk.Label(window, text="First title:").grid(row=1, column=0, padx=5, pady=2, sticky=tk.W)
+        start = ttk.Spinbox(window, from_=0, to=9999999, increment=1, width=10)
+        start.set(0)
+        start.grid(row=1, column=1, sticky=tk.W)
+        ttk.Label(window, text="Count:").grid(row=2, column=0, padx=5, pady=2, sticky=tk.W)
+        count = ttk.Spinbox(window, from_=1, to=1000000, increment=1, width=10)
+        count.set(10)
+        count.grid(row=2, column=1, sticky=tk.W)
+        output = tk.Text(window, width=24, height=15)
+        output.grid(row=4, column=0, columnspan=3, padx=5, pady=5)
+        isbns = []
+
+        def generate():
+            try:
+                block = isbn_block(prefix.get(), int(count.get()), int(start.get()))
+            except ValueError as e:
+                messagebox.showerror("Invalid Block", str(e), parent=window)
+                return
+            isbns[:] = hyphenate(block.tolist())
+            output.delete("1.0", tk.END)
+            output.insert("1.0", "\n".join(isbns))
+
+        def use_first():
+            if isbns:
+                self.isbn_entry.delete(0, tk.END)
+                self.isbn_entry.insert(0, isbns[0])
+
+        def save():
+            path = filedialog.asksaveasfilename(defaultextension=".csv", parent=window,
+                                                filetypes=[("CSV", "*.csv")])
+            if path and isbns:
+                with open(path, "w") as f:
+                    f.write("isbn\n" + "\n".join(isbns) + "\n")
+
+        buttons = ttk.Frame(window)
+        buttons.grid(row=3, column=0, columnspan=3, sticky=tk.W, padx=5)
+        ttk.Button(buttons, text="Generate", command=generate).pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Use First for This Book", command=use_first).pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Save CSV", command=save).pack(side=tk.LEFT)
+
+    def open_batch_processor(self):
+        manifest = filedialog.askopenfilename(filetypes=[("Batch Manifest", "*.csv *.json")])
+        if not manifest:
+            return
+        output_dir = filedialog.askdirectory(title="Batch Output Folder")
+        if not output_dir:
+            return
+        from kdp.batch import BatchScheduler, load_manifest
+
+        try:
+            jobs = load_manifest(manifest, output_dir)
+        except Exception as e:
+            logging.error(f"Manifest load failed: {str(e)}")
+            messagebox.showerror("Invalid Manifest", str(e))
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title(f"Batch Processor - {os.path.basename(manifest)}")
+        tree = ttk.Treeview(window, columns=("status", "attempts", "error"))
+        tree.heading("#0", text="Output")
+        tree.heading("status", text="Status")
+        tree.heading("attempts", text="Attempts")
+        tree.heading("error", text="Error")
+        for i, job in enumerate(jobs):
+            tree.insert("", tk.END, iid=str(i), text=os.path.basename(job.output),
+                        values=(job.status, 0, ""))
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        # Scheduler runs off the main thread; status changes come back via a queue
+        scheduler = BatchScheduler()
+        updates = queue.Queue()
+        ttk.Button(window, text="Cancel", command=scheduler.cancel).pack(side=tk.RIGHT, padx=5, pady=5)
+        window.protocol("WM_DELETE_WINDOW", lambda: (scheduler.cancel(), window.destroy()))
+        worker = threading.Thread(
+            target=scheduler.run,
+            args=(jobs, lambda i, job: updates.put((i, job.status, job.attempts, job.error))),
+            daemon=True)
+        worker.start()
+        self.root.after(100, self.poll_batch, tree, jobs, updates, worker)
+
+    def poll_batch(self, tree, jobs, updates, worker):
+        if not tree.winfo_exists():
+            return
+        while not updates.empty():
+            i, status, attempts, error = updates.get_nowait()
+            tree.item(str(i), values=(status, attempts, error))
+        if worker.is_alive() or not updates.empty():
+            self.root.after(100, self.poll_batch, tree, jobs, updates, worker)
+            return
+        from kdp.batch import DONE as JOB_DONE
+
+        done = sum(job.status == JOB_DONE for job in jobs)
+        self.status.config(text=f"Batch finished: {done}/{len(jobs)} books generated")
 
     def new_project(self):
         # Reset all fields
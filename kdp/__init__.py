@@ -0,0 +1,7 @@
+"""
+Headless publishing core for the KDP Professional Publishing Suite.
+
+Nothing in this package imports tkinter, so books can be rendered on build
+servers without a display. The GUI in book_generator_gui.py is a thin client
+over these modules.
+"""
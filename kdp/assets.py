@@ -0,0 +1,238 @@
+"""
+Header-only image inspection.
+
+inspect_image() reads just the JPEG markers, PNG chunks or TIFF IFD that
+describe an image: dimensions, mode, bit depth, DPI, embedded ICC profile,
+EXIF orientation and progressive/interlaced encoding. No pixel data is read
+or decoded, so a folder of thousands of covers validates in seconds.
+
+file_digest() is the content hash the on-disk caches for covers and fonts
+are keyed by.
+
+    python -m kdp.assets covers/
+"""
+
+import hashlib
+import os
+import struct
+import sys
+from dataclasses import dataclass
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff")
+
+# (path, size, mtime) -> sha256, so unchanged files are not re-hashed
+_digests = {}
+
+
+def file_digest(path):
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if key not in _digests:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        _digests[key] = h.hexdigest()
+    return _digests[key]
+
+
+@dataclass(frozen=True, slots=True)
+class ImageInfo:
+    format: str
+    width: int
+    height: int
+    mode: str
+    bits: int = 8
+    dpi: tuple = None  # None when the file does not say
+    icc: bool = False
+    orientation: int = 1  # EXIF orientation, 1 = upright
+    progressive: bool = False
+    adobe: bool = False  # JPEG APP14 marker (inverted CMYK)
+
+
+def _exif_orientation(data):
+    # data is a TIFF structure (EXIF payload); return the 0x0112 tag or 1
+    try:
+        endian = "<" if data[:2] == b"II" else ">"
+        (offset,) = struct.unpack(endian + "I", data[4:8])
+        (count,) = struct.unpack(endian + "H", data[offset:offset + 2])
+        for i in range(count):
+            entry = data[offset + 2 + 12 * i: offset + 14 + 12 * i]
+            tag, kind = struct.unpack(endian + "HH", entry[:4])
+            if tag == 0x0112:
+                return struct.unpack(endian + "H", entry[8:10])[0]
+    except struct.error:
+        pass
+    return 1
+
+
+def _inspect_jpeg(f):
+    dpi = None
+    icc = adobe = False
+    orientation = 1
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError("Truncated or corrupt JPEG header")
+        code = marker[1]
+        if code == 0xFF:  # fill byte
+            f.seek(-1, os.SEEK_CUR)
+            continue
+        if 0xD0 <= code <= 0xD9 or code == 0x01:  # markers without a length
+            continue
+        (length,) = struct.unpack(">H", f.read(2))
+        if length < 2:
+            raise ValueError("Corrupt JPEG segment length")
+        if code == 0xE0:  # APP0 / JFIF density
+            seg = f.read(length - 2)
+            if seg[:5] == b"JFIF\0" and len(seg) >= 12:
+                units, xd, yd = struct.unpack(">BHH", seg[7:12])
+                if units == 1:
+                    dpi = (xd, yd)
+                elif units == 2:
+                    dpi = (round(xd * 2.54), round(yd * 2.54))
+        elif code == 0xE1:  # APP1 / EXIF
+            seg = f.read(length - 2)
+            if seg[:6] == b"Exif\0\0":
+                orientation = _exif_orientation(seg[6:])
+        elif code == 0xE2:  # APP2 / ICC profile chunk
+            icc = icc or f.read(min(length - 2, 12)) == b"ICC_PROFILE\0"
+            f.seek(max(length - 2 - 12, 0), os.SEEK_CUR)
+        elif code == 0xEE:  # APP14 / Adobe
+            adobe = adobe or f.read(min(length - 2, 5)) == b"Adobe"
+            f.seek(max(length - 2 - 5, 0), os.SEEK_CUR)
+        elif 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):  # SOFn
+            bits, height, width, components = struct.unpack(">BHHB", f.read(6))
+            mode = {1: "L", 3: "RGB", 4: "CMYK"}.get(components, "")
+            return ImageInfo("JPEG", width, height, mode, bits, dpi, icc, orientation,
+                             progressive=code in (0xC2, 0xC6, 0xCA, 0xCE), adobe=adobe)
+        else:
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+_PNG_MODES = {0: "L", 2: "RGB", 3: "P", 4: "LA", 6: "RGBA"}
+
+
+def _inspect_png(f):
+    f.seek(8)
+    width = height = bits = 0
+    mode, dpi, icc, interlaced, orientation = "", None, False, False, 1
+    while True:
+        head = f.read(8)
+        if len(head) < 8:
+            raise ValueError("Truncated PNG header")
+        length, kind = struct.unpack(">I4s", head)
+        if kind == b"IHDR":
+            width, height, bits, color, _, _, interlace = struct.unpack(">IIBBBBB", f.read(13))
+            mode, interlaced = _PNG_MODES.get(color, ""), interlace == 1
+            f.seek(4, os.SEEK_CUR)
+            continue
+        if kind == b"pHYs":
+            ppx, ppy, unit = struct.unpack(">IIB", f.read(9))
+            if unit == 1:  # pixels per metre
+                dpi = (round(ppx * 0.0254), round(ppy * 0.0254))
+            f.seek(4, os.SEEK_CUR)
+            continue
+        if kind == b"eXIf":
+            orientation = _exif_orientation(f.read(length))
+            f.seek(4, os.SEEK_CUR)
+            continue
+        if kind in (b"IDAT", b"IEND"):
+            return ImageInfo("PNG", width, height, mode, bits, dpi, icc, orientation, interlaced)
+        icc = icc or kind == b"iCCP"
+        f.seek(length + 4, os.SEEK_CUR)
+
+
+_TIFF_TYPES = {3: ("H", 2), 4: ("I", 4), 5: ("II", 8)}
+
+
+def _inspect_tiff(f):
+    f.seek(0)
+    head = f.read(8)
+    endian = "<" if head[:2] == b"II" else ">"
+    (offset,) = struct.unpack(endian + "I", head[4:8])
+    f.seek(offset)
+    (count,) = struct.unpack(endian + "H", f.read(2))
+    entries = f.read(12 * count)
+
+    tags = {}
+    for i in range(count):
+        tag, kind, n = struct.unpack(endian + "HHI", entries[12 * i: 12 * i + 8])
+        value = entries[12 * i + 8: 12 * i + 12]
+        if kind not in _TIFF_TYPES:
+            tags[tag] = None
+            continue
+        fmt, size = _TIFF_TYPES[kind]
+        if n * size > 4:  # value stored elsewhere; only fetch what we use
+            if tag not in (258, 282, 283):
+                tags[tag] = None
+                continue
+            (pointer,) = struct.unpack(endian + "I", value)
+            pos = f.tell()
+            f.seek(pointer)
+            value = f.read(size)
+            f.seek(pos)
+        parsed = struct.unpack(endian + fmt, value[:size])
+        tags[tag] = parsed[0] / parsed[1] if kind == 5 and parsed[1] else parsed[0]
+
+    photometric = tags.get(262, 2)
+    samples = tags.get(277, 1)
+    mode = {0: "L", 1: "L", 2: "RGBA" if samples == 4 else "RGB", 3: "P", 5: "CMYK"}.get(photometric, "")
+    dpi = None
+    if 282 in tags and 283 in tags:
+        scale = 2.54 if tags.get(296, 2) == 3 else 1
+        dpi = (round(tags[282] * scale), round(tags[283] * scale))
+    return ImageInfo("TIFF", tags.get(256, 0), tags.get(257, 0), mode, tags.get(258) or 1, dpi,
+                     34675 in tags, tags.get(274) or 1)
+
+
+def inspect_image(path):
+    """ImageInfo for path; ValueError if it is not a readable JPEG, PNG or TIFF."""
+    name = os.path.basename(path)
+    with open(path, "rb") as f:
+        magic = f.read(8)
+        if magic[:2] == b"\xff\xd8":
+            inspect = _inspect_jpeg
+        elif magic == b"\x89PNG\r\n\x1a\n":
+            inspect = _inspect_png
+        elif magic[:4] in (b"II*\0", b"MM\0*"):
+            inspect = _inspect_tiff
+        else:
+            raise ValueError(f"Unsupported image format: {name}")
+        try:
+            return inspect(f)
+        except struct.error:
+            # A header field ran past the end of the file
+            raise ValueError(f"Truncated or corrupt image header: {name}") from None
+        except ValueError as e:
+            raise ValueError(f"{e}: {name}") from None
+
+
+def inspect_images(paths):
+    # path -> ImageInfo, or the error message for unreadable files
+    results = {}
+    for path in paths:
+        try:
+            results[path] = inspect_image(path)
+        except (OSError, ValueError) as e:
+            results[path] = str(e)
+    return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    paths = []
+    for arg in argv:
+        if os.path.isdir(arg):
+            paths.extend(os.path.join(arg, name) for name in sorted(os.listdir(arg))
+                         if name.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths.append(arg)
+    for path, info in inspect_images(paths).items():
+        print(f"{path}: {info}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
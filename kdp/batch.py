@@ -0,0 +1,270 @@
+"""
+Manifest-driven batch rendering.
+
+A manifest is a CSV file (one row per book, columns named after BookConfig
+fields, or the short names trim, style, cover and pages) or a JSON list of
+objects with the same keys. Three optional columns control scheduling:
+output (file name, default derived from the title), priority (higher runs
+first) and retries. A row with an unknown column or a bad value becomes a
+FAILED job; the rest of the manifest still runs.
+
+    python -m kdp.batch manifest.csv out/ [--workers N] [--isbn-block PREFIX] [--covers]
+                                          [--metrics FILE.json|FILE.prom [--allocations]]
+
+Jobs run on a bounded pool of long-lived worker processes. Each worker keeps
+its registered fonts, cached page layouts and ruling templates between jobs,
+so later books in a batch skip that setup entirely. With --covers each book
+also gets its full-wrap cover PDF next to the interior, as NAME_cover.pdf.
+Builds go through kdp.build, so re-running a manifest only renders the books
+(or covers) whose settings changed. --metrics adds up every job's stage
+and per-page measurements into one JSON or Prometheus file.
+"""
+
+import csv
+import heapq
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, fields
+
+from .config import BookConfig
+from .fonts import font_name
+from .spine import check_page_count
+
+PENDING, RUNNING, DONE, FAILED, CANCELLED = "pending", "running", "done", "failed", "cancelled"
+
+_CONFIG_FIELDS = {f.name: f.type for f in fields(BookConfig)}
+COLUMN_ALIASES = {"trim": "trim_size", "style": "page_style", "cover": "cover_path",
+                  "pages": "page_count"}
+_SCHEDULING_COLUMNS = ("output", "priority", "retries")
+
+
+@dataclass(slots=True)
+class BatchJob:
+    config: BookConfig  # None when the manifest row could not be read
+    output: str
+    priority: int = 0
+    retries: int = 1
+    status: str = PENDING
+    attempts: int = 0
+    error: str = ""
+    elapsed: float = 0.0
+
+
+def _parse_fonts(value):
+    # "a.ttf;b.ttf" in CSV, or a JSON list of paths / [name, path] pairs
+    if isinstance(value, str):
+        value = [p for p in value.split(";") if p.strip()]
+    return tuple(tuple(f) if not isinstance(f, str) else (font_name(f), f.strip()) for f in value)
+
+
+def _job_from_row(row, output_dir, index):
+    row = {COLUMN_ALIASES.get(k.strip(), k.strip()): v for k, v in row.items()
+           if k and v not in (None, "")}
+    unknown = sorted(set(row) - set(_CONFIG_FIELDS) - set(_SCHEDULING_COLUMNS))
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+    values = {}
+    for key, kind in _CONFIG_FIELDS.items():
+        if key not in row:
+            continue
+        try:
+            values[key] = _parse_fonts(row[key]) if key == "fonts" else kind(row[key])
+        except (TypeError, ValueError):
+            raise ValueError(f"Bad {key} value {row[key]!r}") from None
+    config = BookConfig(**values)
+
+    stem = re.sub(r"[^\w-]+", "_", config.title).strip("_") or f"book_{index + 1}"
+    output = row.get("output") or f"{stem}.pdf"
+    return BatchJob(
+        config=config,
+        output=os.path.join(output_dir, output),
+        priority=int(row.get("priority", 0)),
+        retries=int(row.get("retries", 1)),
+    )
+
+
+def _failed_row(row, output_dir, index, error):
+    # Keep the row in the batch, so its failure is reported like any other job's
+    output = row.get("output") if isinstance(row, dict) else None
+    logging.error(f"Manifest row {index + 1}: {error}")
+    return BatchJob(config=None, output=os.path.join(output_dir, output or f"row_{index + 1}.pdf"),
+                    status=FAILED, error=f"Row {index + 1}: {error}")
+
+
+def load_manifest(path, output_dir="."):
+    with open(path, newline="") as f:
+        if path.lower().endswith(".json"):
+            rows = json.load(f)
+            rows = rows.get("jobs", []) if isinstance(rows, dict) else rows
+        else:
+            rows = list(csv.DictReader(f))
+    jobs = []
+    for i, row in enumerate(rows):
+        try:
+            jobs.append(_job_from_row(row, output_dir, i))
+        except (AttributeError, TypeError, ValueError) as e:
+            jobs.append(_failed_row(row, output_dir, i, e))
+    return jobs
+
+
+def cover_output(output):
+    return os.path.splitext(output)[0] + "_cover.pdf"
+
+
+def _run_job(config, output, covers, trace_allocations, render_options):
+    # Imported here so spawn workers pay for reportlab once, not per job
+    from .build import build_book
+    from .metrics import Metrics
+
+    # trace_allocations is None when the scheduler is not collecting metrics
+    metrics = None if trace_allocations is None else Metrics(trace_allocations)
+    start = time.perf_counter()
+    # Books unchanged since the last run of the manifest are not re-rendered
+    build_book(config, output, cover_output(output) if covers else None, metrics=metrics,
+               **render_options)
+    elapsed = time.perf_counter() - start
+    if metrics is None:
+        return elapsed, None
+    metrics.close()
+    return elapsed, metrics.to_dict()
+
+
+class BatchScheduler:
+    def __init__(self, workers=None, covers=False, metrics=None, **render_options):
+        # metrics, a kdp.metrics.Metrics, collects every job's stages and page timings
+        self.workers = workers or os.cpu_count() or 1
+        self.covers = covers
+        self.metrics = metrics
+        self.render_options = render_options
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self, jobs, on_status=None):
+        """Run jobs to completion; on_status(index, job) is called on every change."""
+        def update(index, status, error=""):
+            jobs[index].status = status
+            jobs[index].error = error
+            if on_status:
+                on_status(index, jobs[index])
+
+        # A page count KDP would reject fails every attempt; fail it up front
+        for i, job in enumerate(jobs):
+            if job.status == PENDING:
+                try:
+                    check_page_count(job.config)
+                except ValueError as e:
+                    update(i, FAILED, str(e))
+
+        # Highest priority first, manifest order breaks ties; rows that failed
+        # to load are already FAILED
+        queue = [(-job.priority, i) for i, job in enumerate(jobs) if job.status == PENDING]
+        heapq.heapify(queue)
+        running = {}
+        context = multiprocessing.get_context("spawn")
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        try:
+            while queue or running:
+                while queue and len(running) < self.workers and not self._cancel.is_set():
+                    _, i = heapq.heappop(queue)
+                    job = jobs[i]
+                    job.attempts += 1
+                    os.makedirs(os.path.dirname(job.output) or ".", exist_ok=True)
+                    trace = self.metrics.trace_allocations if self.metrics else None
+                    args = (job.config, job.output, self.covers, trace, self.render_options)
+                    try:
+                        future = pool.submit(_run_job, *args)
+                    except BrokenProcessPool:
+                        # A worker died (out of memory, segfault); the jobs it took
+                        # down fail below, everything else gets a fresh pool
+                        pool.shutdown(wait=False)
+                        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                        future = pool.submit(_run_job, *args)
+                    running[future] = i
+                    update(i, RUNNING)
+                if self._cancel.is_set():
+                    for _, i in queue:
+                        update(i, CANCELLED)
+                    queue = []
+                if not running:
+                    break
+
+                finished, _ = wait(running, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    i = running.pop(future)
+                    job = jobs[i]
+                    try:
+                        job.elapsed, job_metrics = future.result()
+                        if job_metrics:
+                            self.metrics.merge(job_metrics)
+                            self.metrics.observe("job_seconds", job.elapsed)
+                        update(i, DONE)
+                    except Exception as e:
+                        if isinstance(e, BrokenProcessPool):
+                            e = "Worker process crashed"
+                        logging.error(f"Batch job {job.output} failed (attempt {job.attempts}): {e}")
+                        if job.attempts <= job.retries and not self._cancel.is_set():
+                            heapq.heappush(queue, (-job.priority, i))
+                            update(i, PENDING, str(e))
+                        else:
+                            update(i, FAILED, str(e))
+        finally:
+            pool.shutdown()
+        return jobs
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    workers = isbn_prefix = metrics_file = None
+    covers = "--covers" in argv
+    allocations = "--allocations" in argv
+    argv = [arg for arg in argv if arg not in ("--covers", "--allocations")]
+    if "--workers" in argv:
+        i = argv.index("--workers")
+        workers = int(argv[i + 1])
+        argv = argv[:i] + argv[i + 2:]
+    if "--isbn-block" in argv:
+        i = argv.index("--isbn-block")
+        isbn_prefix = argv[i + 1]
+        argv = argv[:i] + argv[i + 2:]
+    if "--metrics" in argv:
+        i = argv.index("--metrics")
+        metrics_file = argv[i + 1]
+        argv = argv[:i] + argv[i + 2:]
+    if len(argv) != 2:
+        print("usage: python -m kdp.batch MANIFEST.csv|json OUTPUT_DIR [--workers N] "
+              "[--isbn-block PREFIX] [--covers] [--metrics FILE.json|FILE.prom [--allocations]]",
+              file=sys.stderr)
+        return 2
+
+    jobs = load_manifest(argv[0], argv[1])
+    if isbn_prefix:
+        # Books without an ISBN take the next unused one from the block
+        from .isbn import assign_isbns
+
+        loaded = [job for job in jobs if job.config is not None]
+        for job, config in zip(loaded, assign_isbns([job.config for job in loaded], isbn_prefix)):
+            job.config = config
+    metrics = None
+    if metrics_file:
+        from .metrics import Metrics
+
+        metrics = Metrics(allocations)
+    BatchScheduler(workers, covers, metrics).run(
+        jobs, lambda i, job: print(f"[{job.status}] {job.output} {job.error}".rstrip()))
+    if metrics:
+        metrics.write(metrics_file)
+    return 0 if all(job.status == DONE for job in jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+Incremental book builds.
+
+A build is a small dependency graph; every node is keyed by a hash of the
+inputs it actually reads plus the keys of the nodes it depends on:
+
+    layout -> templates -> interior PDF -> preflight report
+    assets (cover image, ICC profile, fonts) -> cover PDF -> cover preflight report
+
+Artefacts (the two PDFs and their preflight reports) are stored in a
+content-addressed cache under their key, and each output file records the
+key it was copied from. A rebuild therefore only renders nodes whose inputs
+changed: editing the title re-renders the cover but not the interior,
+switching back to an earlier design copies the stored PDF, and an unchanged
+project does no work at all. The cache is capped at BUILD_CACHE_MAX_BYTES;
+beyond that the least recently used artefacts are deleted.
+
+    python -m kdp.build spec.json out/ [--preflight]
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from dataclasses import dataclass, field
+
+import reportlab
+
+from .assets import file_digest
+from .config import BookConfig
+from .fileio import atomic_path, atomic_write, prune_lru
+from .layout import layout_key
+from .metrics import NULL_METRICS
+from .progress import NULL_PROGRESS
+from .spine import check_page_count
+
+BUILD_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "kdp_suite", "builds")
+BUILD_CACHE_VERSION = 3  # bump when renderers change what they write
+BUILD_CACHE_MAX_BYTES = 1 << 30
+_ARTEFACT_NAME = re.compile(r"^[0-9a-f]{64}\.(pdf|json)$")  # not in-progress temp files
+
+
+@dataclass(frozen=True, slots=True)
+class BuildNode:
+    name: str
+    deps: tuple
+    inputs: object  # (config, render_options) -> repr-able inputs
+
+
+def _digest(path):
+    return file_digest(path) if path else ""
+
+
+def _writer(options):
+    # The interior writer in use; they produce equivalent but not identical files
+    if options.get("pattern"):
+        return "pattern"
+    return "stream" if options.get("streaming") else "canvas"
+
+
+def _preflight_inputs(config, options):
+    from .preflight import CHECK_VERSION  # needs pypdf
+
+    return CHECK_VERSION, config.page_size, config.color_mode, config.interior
+
+
+NODES = {node.name: node for node in (
+    BuildNode("layout", (), lambda config, options: layout_key(config)),
+    BuildNode("templates", ("layout",), lambda config, options: config.page_style),
+    BuildNode("interior", ("templates",),
+              lambda config, options: (config.page_count, _writer(options))),
+    BuildNode("assets", (), lambda config, options: (
+        _digest(config.cover_path),
+        _digest(config.cmyk_profile) if config.color_mode == "CMYK" else "",
+        tuple((name, _digest(path)) for name, path in config.fonts))),
+    BuildNode("cover", ("assets",), lambda config, options: (
+        config.title, config.author, config.isbn, config.page_size, config.page_count,
+        config.interior, config.bleed, config.color_mode, config.cover_font)),
+    BuildNode("preflight", ("interior",), _preflight_inputs),
+    BuildNode("cover_preflight", ("cover",), _preflight_inputs),
+)}
+
+
+def node_keys(config, targets, options=None):
+    """Content keys of targets and everything they depend on, by node name."""
+    options = options or {}
+    keys = {}
+
+    def visit(name):
+        if name not in keys:
+            node = NODES[name]
+            deps = tuple(visit(dep) for dep in node.deps)
+            key = repr((name, BUILD_CACHE_VERSION, reportlab.Version,
+                        node.inputs(config, options), deps))
+            keys[name] = hashlib.sha256(key.encode()).hexdigest()
+        return keys[name]
+
+    for target in targets:
+        visit(target)
+    return keys
+
+
+@dataclass(slots=True)
+class BuildResult:
+    outputs: dict = field(default_factory=dict)  # node name -> output path
+    built: list = field(default_factory=list)  # rendered
+    reused: list = field(default_factory=list)  # copied from the cache
+    skipped: list = field(default_factory=list)  # output already up to date
+    report: object = None  # PreflightReport of the interior when requested
+    cover_report: object = None  # and of the cover, when one was built
+
+    def summary(self):
+        parts = [f"{verb} {', '.join(names)}" for verb, names in
+                 (("built", self.built), ("reused", self.reused), ("up to date", self.skipped))
+                 if names]
+        return "; ".join(parts)
+
+
+def _stamp_file(target, cache_dir):
+    name = hashlib.sha256(os.path.abspath(target).encode()).hexdigest()
+    return os.path.join(cache_dir, "targets", name + ".json")
+
+
+def _up_to_date(target, key, cache_dir):
+    # The output still holds the bytes last copied there for key
+    try:
+        with open(_stamp_file(target, cache_dir)) as f:
+            stamp = json.load(f)
+        st = os.stat(target)
+    except (OSError, ValueError):
+        return False
+    return stamp == {"key": key, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _materialize(name, key, target, build, cache_dir, result):
+    result.outputs[name] = target
+    if _up_to_date(target, key, cache_dir):
+        result.skipped.append(name)
+        return
+    artefact = os.path.join(cache_dir, key + ".pdf")
+    if os.path.exists(artefact):
+        os.utime(artefact)  # eviction goes by modification time
+        result.reused.append(name)
+    else:
+        with atomic_path(artefact) as tmp:
+            build(tmp)
+        result.built.append(name)
+
+    with atomic_path(target) as tmp:
+        shutil.copyfile(artefact, tmp)
+    st = os.stat(target)
+    with atomic_write(_stamp_file(target, cache_dir)) as f:
+        json.dump({"key": key, "size": st.st_size, "mtime_ns": st.st_mtime_ns}, f)
+
+
+def _preflight(config, name, key, output, pdf, cache_dir, result):
+    # pdf is the stored artefact when there is one: output is byte-identical
+    from .preflight import PageReport, PreflightReport, preflight_pdf
+
+    cover = name == "cover_preflight"
+    stored = os.path.join(cache_dir, key + ".json")
+    try:
+        with open(stored) as f:
+            data = json.load(f)
+        os.utime(stored)
+        result.skipped.append(name)
+    except (OSError, ValueError):
+        report = preflight_pdf(pdf, config, cover=cover)
+        data = {"issues": report.issues,
+                "pages": [[page.page, list(page.issues)] for page in report.pages]}
+        with atomic_write(stored) as f:
+            json.dump(data, f)
+        result.built.append(name)
+    cached = name in result.skipped
+    report = PreflightReport(output, [PageReport(page, tuple(issues), cached)
+                                      for page, issues in data["pages"]],
+                             list(data["issues"]))
+    if cover:
+        result.cover_report = report
+    else:
+        result.report = report
+
+
+def prune_cache(cache_dir=BUILD_CACHE_DIR, max_bytes=BUILD_CACHE_MAX_BYTES, keep=()):
+    """Delete the least recently used artefacts until the cache fits max_bytes.
+
+    Paths in keep are never deleted. Returns the number of bytes freed.
+    """
+    return prune_lru(cache_dir, max_bytes, _ARTEFACT_NAME, keep)
+
+
+def build_book(config, output, cover_output=None, preflight=False, cache_dir=BUILD_CACHE_DIR,
+               progress=None, metrics=None, max_cache_bytes=BUILD_CACHE_MAX_BYTES,
+               **render_options):
+    """Bring output (interior) and cover_output (full-wrap cover) up to date.
+
+    Only nodes whose inputs changed are rendered; see the module docstring.
+    preflight=True also checks the interior (requires pypdf) and sets
+    result.report, and the cover, if built, setting result.cover_report. render_options are passed to render_book(); progress and
+    cancellation work as there, and a cancelled build leaves the cache and
+    outputs as they were. metrics (a kdp.metrics.Metrics) also receives the
+    renderers' stages, so a build that skips a node records nothing for it.
+    Raises ValueError, before any work, for a page count KDP does not accept.
+    After a build that stored anything, the cache is pruned to max_cache_bytes.
+    """
+    check_page_count(config)
+    stages = progress or NULL_PROGRESS
+    metrics = metrics or NULL_METRICS
+    targets = ["interior"] + (["cover"] if cover_output else [])
+    if preflight:
+        targets += ["preflight"] + (["cover_preflight"] if cover_output else [])
+    with metrics.stage("plan"):
+        keys = node_keys(config, targets, render_options)
+    result = BuildResult()
+
+    def interior(path):
+        from .render import render_book
+
+        render_book(config, path, progress=progress, metrics=metrics, **render_options)
+
+    def cover(path):
+        from .wrap import render_cover
+
+        with stages.stage("cover"), metrics.stage("cover"):
+            render_cover(config, path, metrics)
+
+    _materialize("interior", keys["interior"], output, interior, cache_dir, result)
+    if cover_output:
+        _materialize("cover", keys["cover"], cover_output, cover, cache_dir, result)
+    if preflight:
+        checks = [("preflight", "interior", output)]
+        if cover_output:
+            checks.append(("cover_preflight", "cover", cover_output))
+        with stages.stage("preflight"), metrics.stage("preflight"):
+            for name, source, target in checks:
+                artefact = os.path.join(cache_dir, keys[source] + ".pdf")
+                _preflight(config, name, keys[name], target,
+                           artefact if os.path.exists(artefact) else target, cache_dir, result)
+    if result.built:
+        keep = {os.path.join(cache_dir, keys[name] + suffix)
+                for name, suffix in (("interior", ".pdf"), ("cover", ".pdf"),
+                                     ("preflight", ".json"), ("cover_preflight", ".json"))
+                if name in keys}
+        prune_cache(cache_dir, max_cache_bytes, keep)
+    return result
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    preflight = "--preflight" in argv
+    argv = [arg for arg in argv if arg != "--preflight"]
+    if len(argv) != 2:
+        print("usage: python -m kdp.build SPEC.json OUTPUT_DIR [--preflight]", file=sys.stderr)
+        return 2
+    with open(argv[0]) as f:
+        config = BookConfig.from_dict(json.load(f))
+    stem = os.path.splitext(os.path.basename(argv[0]))[0]
+    try:
+        result = build_book(config, os.path.join(argv[1], stem + ".pdf"),
+                            os.path.join(argv[1], stem + "_cover.pdf"), preflight)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(result.summary())
+    reports = [report for report in (result.report, result.cover_report) if report is not None]
+    for report in reports:
+        for line in report.summary():
+            print(f"{report.path}: {line}")
+    return 0 if all(report.ok for report in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+ICC-managed colour conversion.
+
+Transforms are expensive to build, so they are cached per (source profile,
+output profile, intent) for the life of the process. Conversion runs over
+horizontal strips so a full-wrap cover never needs more than the source, the
+destination and one strip in memory at once.
+"""
+
+import logging
+from functools import lru_cache
+from io import BytesIO
+
+from PIL import Image, ImageCms
+
+DEFAULT_INTENT = ImageCms.Intent.RELATIVE_COLORIMETRIC
+TILE_ROWS = 256
+
+# ICC colour space signatures mapped to PIL modes
+_PROFILE_MODES = {"RGB ": "RGB", "CMYK": "CMYK", "GRAY": "L"}
+
+
+@lru_cache(maxsize=32)
+def load_profile(source):
+    # source is a file path, raw ICC bytes, or None for built-in sRGB
+    if source is None:
+        return ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB"))
+    if isinstance(source, bytes):
+        return ImageCms.ImageCmsProfile(BytesIO(source))
+    return ImageCms.ImageCmsProfile(source)
+
+
+def profile_mode(profile):
+    return _PROFILE_MODES[profile.profile.xcolor_space]
+
+
+@lru_cache(maxsize=32)
+def get_transform(source, output, intent=DEFAULT_INTENT):
+    src, dst = load_profile(source), load_profile(output)
+    return ImageCms.buildTransform(src, dst, profile_mode(src), profile_mode(dst), intent)
+
+
+def convert_image(img, output_profile, intent=DEFAULT_INTENT, tile_rows=TILE_ROWS):
+    """Convert img to the colour space of output_profile (a path).
+
+    The image's embedded ICC profile is honoured; untagged images are
+    treated as sRGB.
+    """
+    source = img.info.get("icc_profile") or None
+    source_mode = profile_mode(load_profile(source))
+    if img.mode != source_mode:
+        img = img.convert(source_mode)
+
+    transform = get_transform(source, output_profile, intent)
+    out = Image.new(transform.output_mode, img.size)
+    width, height = img.size
+    for top in range(0, height, tile_rows):
+        box = (0, top, width, min(top + tile_rows, height))
+        out.paste(ImageCms.applyTransform(img.crop(box), transform), box)
+    return out
+
+
+def validate_cmyk_profile(path):
+    if profile_mode(load_profile(path)) != "CMYK":
+        raise ValueError(f"{path} is not a CMYK output profile")
+
+
+def is_srgb(icc):
+    # True for untagged data (treated as sRGB) and sRGB profiles, by description
+    if not icc:
+        return True
+    try:
+        description = load_profile(icc).profile.profile_description or ""
+    except (OSError, ImageCms.PyCMSError):
+        return False
+    return "srgb" in description.lower()
+
+
+def to_rgb(img, intent=DEFAULT_INTENT):
+    # sRGB through the image's embedded profile, when it has one
+    icc = img.info.get("icc_profile")
+    if img.mode == "RGB" and is_srgb(icc):
+        return img
+    if icc:
+        return convert_image(img, None, intent)
+    return img.convert("RGB")
+
+
+def to_cmyk(img, output_profile="", intent=DEFAULT_INTENT):
+    if img.mode == "CMYK":
+        return img
+    if not output_profile:
+        logging.warning("No CMYK output profile configured; using uncalibrated conversion")
+        return img.convert("CMYK")
+    validate_cmyk_profile(output_profile)
+    return convert_image(img, output_profile, intent)
@@ -0,0 +1,123 @@
+"""Immutable book specification shared by the GUI and the headless renderer."""
+
+import os
+from dataclasses import asdict, dataclass, field
+
+import reportlab
+from reportlab.lib.pagesizes import A4, LETTER
+from reportlab.lib.units import inch
+
+# Trim sizes offered in the Design tab, in points
+TRIM_SIZES = {
+    "6x9": (6 * inch, 9 * inch),
+    "8.5x11": LETTER,
+    "A4": A4,
+}
+DEFAULT_TRIM = "8.5x11"
+
+# Interior types (paper and ink): name -> (label, paper thickness in inches per page)
+INTERIORS = {
+    "bw_white": ("Black & white, white paper", 0.002252),
+    "bw_cream": ("Black & white, cream paper", 0.0025),
+    "standard_color": ("Standard color, white paper", 0.002252),
+    "premium_color": ("Premium color, white paper", 0.002347),
+}
+DEFAULT_INTERIOR = "bw_white"
+
+PAGE_STYLES = ("lined", "dotted", "grid", "blank")
+ORIENTATIONS = ("Portrait", "Landscape")
+COLOR_MODES = ("RGB", "CMYK")
+# TrueType fonts that ship with reportlab (Bitstream Vera). KDP rejects covers
+# with non-embedded fonts, so cover text is always set in one of these or one
+# of the book's own fonts, and embedded like them
+_REPORTLAB_FONTS = os.path.join(os.path.dirname(reportlab.__file__), "fonts")
+BUNDLED_FONTS = {
+    "Vera": os.path.join(_REPORTLAB_FONTS, "Vera.ttf"),
+    "Vera-Bold": os.path.join(_REPORTLAB_FONTS, "VeraBd.ttf"),
+}
+DEFAULT_COVER_FONT = "Vera-Bold"
+
+
+def _check_choice(what, value, choices):
+    if value not in choices:
+        raise ValueError(f"Unknown {what} {value!r}; expected one of {', '.join(choices)}")
+
+
+@dataclass(frozen=True, slots=True)
+class BookConfig:
+    # Captured once on the Tk main thread and handed to the renderer, so the
+    # render loop never touches widgets. Lengths are in inches, as entered
+    # in the GUI.
+    title: str = ""
+    author: str = ""
+    isbn: str = ""
+    trim_size: str = DEFAULT_TRIM
+    orientation: str = "Portrait"
+    page_style: str = "lined"
+    line_spacing: float = 0.25
+    margin_top: float = 0.5
+    margin_bottom: float = 0.5
+    margin_left: float = 0.5
+    margin_right: float = 0.5
+    bleed: float = 0.125
+    color_mode: str = "RGB"
+    cmyk_profile: str = ""  # output ICC profile used when color_mode is CMYK
+    page_count: int = 100
+    interior: str = DEFAULT_INTERIOR
+    cover_path: str = ""
+    fonts: tuple = field(default=())  # (name, path) pairs
+    cover_font: str = DEFAULT_COVER_FONT  # title, author and barcode text on the cover
+
+    def __post_init__(self):
+        # Build servers render whatever the spec says, so reject anything the
+        # renderer would otherwise misread or silently replace with a default
+        _check_choice("trim size", self.trim_size, TRIM_SIZES)
+        _check_choice("orientation", self.orientation, ORIENTATIONS)
+        _check_choice("page style", self.page_style, PAGE_STYLES)
+        _check_choice("color mode", self.color_mode, COLOR_MODES)
+        _check_choice("interior", self.interior, INTERIORS)
+        _check_choice("cover font", self.cover_font,
+                      tuple(BUNDLED_FONTS) + tuple(name for name, _ in self.fonts))
+        if not self.line_spacing > 0:
+            raise ValueError(f"Line spacing must be positive, not {self.line_spacing}")
+        names = ("top", "bottom", "left", "right")
+        for name, margin in zip(names, (self.margin_top, self.margin_bottom,
+                                        self.margin_left, self.margin_right)):
+            if not margin > 0:
+                raise ValueError(f"The {name} margin must be positive, not {margin}")
+        if self.bleed < 0:
+            raise ValueError(f"Bleed cannot be negative, not {self.bleed}")
+        if self.page_count < 1:
+            raise ValueError(f"A book needs at least one page, not {self.page_count}")
+        width, height = self.page_size
+        if (self.margin_left + self.margin_right) * inch >= width or \
+                (self.margin_top + self.margin_bottom) * inch >= height:
+            raise ValueError("The margins leave no room on the page")
+
+    @property
+    def page_size(self):
+        width, height = TRIM_SIZES[self.trim_size]
+        if self.orientation == "Landscape":
+            return height, width
+        return width, height
+
+    @property
+    def cover_font_path(self):
+        # The TrueType file for cover_font, from the book's fonts or the bundled ones
+        return {**BUNDLED_FONTS, **dict(self.fonts)}[self.cover_font]
+
+    @property
+    def margins(self):
+        # top, bottom, left, right in points
+        return tuple(m * inch for m in (self.margin_top, self.margin_bottom,
+                                        self.margin_left, self.margin_right))
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        if "fonts" in data:
+            data["fonts"] = tuple(tuple(f) for f in data["fonts"])
+        return cls(**data)
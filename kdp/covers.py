@@ -0,0 +1,188 @@
+"""
+Cover image preparation.
+
+The cover image is printed over one physical box, artwork_size(): the whole
+full-wrap cover when the image has its aspect ratio, otherwise the front
+panel from the spine fold to the outer bleed edge, with bleed top and
+bottom. Validation, preparation and placement all use that box.
+
+Designers often supply covers at 600-1200 DPI. prepare_cover() resamples the
+image once to the exact pixel size needed at print resolution and stores the
+result in an on-disk cache keyed by the source file's hash, the target size
+and the colour mode, so regenerating a book never decodes or resamples the
+same cover twice. The cache is pruned to CACHE_MAX_BYTES, least recently
+used first.
+
+JPEGs that are already print-ready skip that stage entirely: cover_image()
+hands the original file to the PDF writer, which embeds the compressed data
+as-is (DCTDecode) without decoding it.
+"""
+
+import hashlib
+import logging
+import os
+import re
+
+from PIL import Image, ImageOps
+from reportlab.lib.units import inch
+
+from .assets import file_digest, inspect_image
+from .color import is_srgb, to_cmyk, to_rgb
+from .fileio import atomic_path, prune_lru
+from .spine import cover_size
+
+PRINT_DPI = 300
+# Embed a JPEG untouched up to this much oversampling; beyond it, downsampling
+# saves more output size than passthrough saves time
+MAX_PASSTHROUGH_DPI = PRINT_DPI * 1.5
+PASSTHROUGH_MODES = {"RGB": ("RGB", "L"), "CMYK": ("CMYK",)}
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "kdp_suite", "covers")
+CACHE_VERSION = 3  # bump when prepare_cover() output changes
+CACHE_MAX_BYTES = 512 << 20
+_ENTRY_NAME = re.compile(r"^[0-9a-f]{64}\.jpg$")  # not in-progress temp files
+# Aspect ratio mismatch, as a fraction, above which cropping a cover is logged
+CROP_WARN_FRACTION = 0.01
+
+
+def image_size(path):
+    # Upright pixel size, from the header only
+    info = inspect_image(path)
+    if info.orientation in (5, 6, 7, 8):  # stored rotated by 90 degrees
+        return info.height, info.width
+    return info.width, info.height
+
+
+def artwork_size(path, config):
+    """Physical size (w, h) in inches path prints at, and whether it is a full wrap.
+
+    Artwork with the full-wrap cover's aspect ratio (within
+    CROP_WARN_FRACTION) covers the whole wrap; anything else is a front
+    cover: trim width plus the outer bleed by trim height plus bleed top
+    and bottom.
+    """
+    wrap_w, wrap_h = cover_size(config)
+    width, height = image_size(path)
+    if abs(width * wrap_h / (height * wrap_w) - 1) <= CROP_WARN_FRACTION:
+        return (wrap_w, wrap_h), True
+    trim_w, trim_h = (v / inch for v in config.page_size)
+    return (trim_w + config.bleed, trim_h + 2 * config.bleed), False
+
+
+def crop_fraction(path, config):
+    # How far the image's aspect ratio is off artwork_size(); prepare_cover() crops that much
+    width, height = image_size(path)
+    (art_w, art_h), _ = artwork_size(path, config)
+    return abs(width * art_h / (height * art_w) - 1)
+
+
+def effective_dpi(path, config):
+    """Pixels per inch the cover will actually print at, as (x, y).
+
+    Measured over artwork_size(), so the DPI tag in the file is irrelevant.
+    Only the header is read.
+    """
+    width, height = image_size(path)
+    (art_w, art_h), _ = artwork_size(path, config)
+    return width / art_w, height / art_h
+
+
+def _flatten(img):
+    # JPEG has no alpha channel; composite transparent covers onto white
+    if img.mode in ("RGBA", "LA") or "transparency" in img.info:
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, "white")
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img
+
+
+def prepare_cover(path, size, color_mode="RGB", cache_dir=CACHE_DIR, dpi=PRINT_DPI,
+                  cmyk_profile=""):
+    """Return the path of a cached copy of path resampled to size (w, h) pixels.
+
+    An image with a different aspect ratio is scaled to cover size and
+    centre-cropped, never stretched. The copy is in color_mode: CMYK
+    through cmyk_profile, RGB through the image's own ICC profile.
+    """
+    width, height = size
+    profile = file_digest(cmyk_profile) if color_mode == "CMYK" and cmyk_profile else ""
+    key = f"{CACHE_VERSION}:{file_digest(path)}:{width}x{height}:{color_mode}:{profile}"
+    key = hashlib.sha256(key.encode()).hexdigest()
+    cached = os.path.join(cache_dir, key + ".jpg")
+    try:
+        os.utime(cached)  # eviction goes by modification time
+        return cached
+    except FileNotFoundError:
+        pass
+
+    with Image.open(path) as img:
+        # Let the JPEG decoder downscale by a power of two while decoding
+        img.draft("RGB", (width, height))
+        img = ImageOps.exif_transpose(img)
+        icc = img.info.get("icc_profile")
+        img = _flatten(img)
+        if img.mode not in ("RGB", "CMYK"):
+            img = img.convert("RGB")
+        if img.size != (width, height):
+            mismatch = abs(img.width * height / (img.height * width) - 1)
+            if mismatch > CROP_WARN_FRACTION:
+                logging.warning(f"{os.path.basename(path)} is {img.width}x{img.height} px, "
+                                f"{mismatch:.0%} off the {width}x{height} px cover; cropping to fit")
+            img = ImageOps.fit(img, (width, height), Image.LANCZOS)
+        if icc:
+            img.info["icc_profile"] = icc
+        # Resample first so colour conversion only touches print-size pixels
+        img = to_cmyk(img, cmyk_profile) if color_mode == "CMYK" else to_rgb(img)
+
+        # Write atomically so concurrent batch workers never see a partial file
+        with atomic_path(cached) as tmp:
+            img.save(tmp, "JPEG", quality=95, dpi=(dpi, dpi))
+    prune_lru(cache_dir, CACHE_MAX_BYTES, _ENTRY_NAME, keep={cached})
+    return cached
+
+
+def _srgb_tagged(path):
+    # Whether the embedded ICC profile is sRGB; opening the image only parses its header
+    try:
+        with Image.open(path) as img:
+            icc = img.info.get("icc_profile")
+    except OSError:
+        return False
+    return bool(icc) and is_srgb(icc)
+
+
+def passthrough_ok(path, size, color_mode="RGB"):
+    """True if path is a JPEG that can be embedded as-is at size (w, h) pixels.
+
+    reportlab writes every 4-channel JPEG with an inverted Decode array, so
+    only Adobe (APP14) CMYK files, which store inverted CMYK, print
+    correctly untouched. RGB files must be untagged or tagged sRGB; other
+    profiles are converted by prepare_cover().
+    """
+    width, height = size
+    try:
+        info = inspect_image(path)
+    except (OSError, ValueError):
+        return False
+    if info.format != "JPEG" or info.mode not in PASSTHROUGH_MODES.get(color_mode, ()):
+        return False
+    if info.orientation != 1 or info.bits != 8:  # would need rotating / re-encoding
+        return False
+    if info.mode == "CMYK" and not info.adobe:
+        return False
+    if info.mode == "RGB" and info.icc and not _srgb_tagged(path):
+        return False
+    src_w, src_h = info.width, info.height
+
+    # Same aspect ratio (within a pixel or so) and effective DPI in range
+    if abs(src_w / src_h - width / height) > 0.01 * width / height:
+        return False
+    effective_dpi = PRINT_DPI * src_w / width
+    return PRINT_DPI * 0.99 <= effective_dpi <= MAX_PASSTHROUGH_DPI
+
+
+def cover_image(path, size, color_mode="RGB", cmyk_profile="", cache_dir=CACHE_DIR):
+    # The file to embed: the original when it is print-ready, else a prepared copy
+    if passthrough_ok(path, size, color_mode):
+        return path
+    return prepare_cover(path, size, color_mode, cache_dir, cmyk_profile=cmyk_profile)
@@ -0,0 +1,85 @@
+"""
+Atomic file writes and size-capped cache directories.
+
+Every on-disk cache (covers, fonts, preflight results, build artefacts) and
+every build output is written through atomic_path() or atomic_write(): the
+data goes to a temporary file in the target's directory, which replaces the
+target in one step once it is complete. Readers, including concurrent batch
+workers, therefore see the old file or the new one, never a partial file,
+and a failed write leaves nothing behind.
+
+prune_lru() keeps a cache directory under a size limit by deleting the
+least recently used entries, by modification time; caches touch entries
+(os.utime) when they reuse them.
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+# mkstemp creates files readable by the owner only; written files get the
+# mode open() would have given them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextmanager
+def atomic_path(path):
+    """Yield a temporary path that replaces path when the block succeeds."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix=os.path.splitext(path)[1], dir=directory)
+    os.close(fd)
+    try:
+        yield tmp
+        os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+@contextmanager
+def atomic_write(path, mode="w"):
+    # Like open(path, mode), but the file only appears once it is complete
+    with atomic_path(path) as tmp, open(tmp, mode) as f:
+        yield f
+
+
+def prune_lru(directory, max_bytes, pattern, keep=()):
+    """Delete the least recently used files until directory fits max_bytes.
+
+    Only file names matching the compiled regex pattern count towards the
+    size or are deleted, so in-progress temporary files are left alone.
+    Paths in keep are never deleted. Returns the number of bytes freed.
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    entries, total = [], 0
+    for name in names:
+        if not pattern.match(name):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime_ns, st.st_size, path))
+        total += st.st_size
+    freed = 0
+    for _, size, path in sorted(entries):
+        if total - freed <= max_bytes:
+            break
+        if path in keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:  # another process removed it first
+            continue
+        freed += size
+    return freed
@@ -0,0 +1,286 @@
+"""
+Font registration shared by the GUI, the renderer and batch workers.
+
+Parsing a TrueType file is slow for large CJK or multi-weight fonts, so the
+parsed tables and metrics are pickled to an on-disk cache keyed by the font
+file's hash and the reportlab version. Later runs, and every batch worker,
+load the pickle instead of re-parsing; the cache is only ever read by
+workers and written atomically, so sharing it between processes is safe.
+
+register_font_dir() sets up a whole font folder: unseen files are parsed in
+a process pool (which also fills the cache), regular/bold/italic faces are
+grouped into reportlab font families, and an index of each file's name,
+family and style is kept next to the cache so a rescan only parses new or
+changed files.
+
+Fonts are registered lazily: declare_font() records only the name and path,
+and the font is loaded the first time reportlab looks the name up (setFont,
+stringWidth, a paragraph style). A worker's memory therefore grows with the
+fonts a book actually uses, not with the size of the font library.
+
+    python -m kdp.fonts /path/to/fonts [--workers N]
+"""
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from fnmatch import fnmatch
+from weakref import WeakKeyDictionary
+
+import reportlab
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont, TTFontFace
+from reportlab.rl_config import unShapedFontGlob
+
+from .assets import file_digest
+from .fileio import atomic_write
+
+FONT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "kdp_suite", "fonts")
+FONT_CACHE_VERSION = 1  # bump when the pickled layout changes
+FONT_EXTENSIONS = (".ttf", ".otf")
+INDEX_FILE = "index.json"
+# sfnt versions reportlab can parse: TrueType outlines, plain or Apple
+_TRUETYPE_MAGIC = (b"\x00\x01\x00\x00", b"true")
+
+# Face attributes that are rebuilt on load instead of pickled: the raw file
+# (re-read, it is needed for subsetting) and a closure that cannot be pickled
+_UNPICKLED_FACE = ("_ttf_data", "_pdfScale")
+
+
+@dataclass(frozen=True, slots=True)
+class FontEntry:
+    path: str
+    name: str
+    family: str
+    bold: bool = False
+    italic: bool = False
+
+
+def font_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _cache_file(path, cache_dir):
+    key = f"{file_digest(path)}:{reportlab.Version}:{FONT_CACHE_VERSION}"
+    return os.path.join(cache_dir, hashlib.sha256(key.encode()).hexdigest() + ".pickle")
+
+
+def _store(font, cached):
+    face = {k: v for k, v in vars(font.face).items() if k not in _UNPICKLED_FACE}
+    attrs = {k: v for k, v in vars(font).items() if k not in ("face", "state")}
+    with atomic_write(cached, "wb") as f:
+        pickle.dump((attrs, face), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _restore(name, path, attrs, face_state):
+    face = TTFontFace.__new__(TTFontFace)
+    face.__dict__.update(face_state)
+    with open(path, "rb") as f:
+        face._ttf_data = f.read()
+    if face.unitsPerEm == 1000:
+        face._pdfScale = lambda x: x
+    else:
+        scale = 1000 / face.unitsPerEm
+        face._pdfScale = lambda x: x * scale
+
+    font = TTFont.__new__(TTFont)
+    font.__dict__.update(attrs, fontName=name, face=face, state=WeakKeyDictionary())
+    font.shapable = not any(fnmatch(name, pattern) for pattern in unShapedFontGlob)
+    return font
+
+
+def load_font(name, path, cache_dir=FONT_CACHE_DIR):
+    """Return a TTFont for path, from the parsed-font cache when possible."""
+    cached = _cache_file(path, cache_dir)
+    try:
+        with open(cached, "rb") as f:
+            attrs, face_state = pickle.load(f)
+        return _restore(name, path, attrs, face_state)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # A stale or truncated entry is not fatal; parse and overwrite it
+        logging.warning(f"Ignoring unreadable font cache for {os.path.basename(path)}: {str(e)}")
+
+    font = TTFont(name, path)
+    try:
+        _store(font, cached)
+    except OSError as e:
+        logging.warning(f"Could not cache font {os.path.basename(path)}: {str(e)}")
+    return font
+
+
+def check_font_file(path):
+    # Cheap stand-in for parsing when a font is declared but not yet loaded
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic == b"OTTO":
+        raise ValueError(f"{os.path.basename(path)} has PostScript (CFF) outlines, "
+                         "which are not supported")
+    if magic not in _TRUETYPE_MAGIC:
+        raise ValueError(f"{os.path.basename(path)} is not a TrueType font")
+
+
+# name -> (path, cache_dir) for fonts declared but not loaded yet
+_pending = {}
+_pending_lock = threading.RLock()
+_find_font = pdfmetrics.findFontAndRegister
+
+
+def _find_pending(name):
+    # Called by pdfmetrics.getFont() for names it has not registered
+    with _pending_lock:
+        if str(name) in pdfmetrics.getRegisteredFontNames():  # loaded by another thread
+            return pdfmetrics.getFont(name)
+        pending = _pending.pop(str(name), None)
+        if pending is None:
+            return _find_font(name)
+        font = load_font(str(name), *pending)
+        pdfmetrics.registerFont(font)
+        return font
+
+
+pdfmetrics.findFontAndRegister = _find_pending
+
+
+def declare_font(name, path, cache_dir=FONT_CACHE_DIR):
+    """Make name available to reportlab without loading it until first use."""
+    with _pending_lock:
+        if name not in pdfmetrics.getRegisteredFontNames():
+            _pending[name] = (path, cache_dir)
+
+
+def register_fonts(fonts, cache_dir=FONT_CACHE_DIR):
+    # pdfmetrics is process-global, so each worker loads a font at most once,
+    # and only if the book draws with it
+    for name, path in fonts:
+        declare_font(name, path, cache_dir)
+
+
+def _describe(path, cache_dir):
+    # Runs in a pool worker: parse (filling the cache) and report the style
+    face = load_font(font_name(path), path, cache_dir).face
+    style = face.styleName.decode("latin-1").lower()
+    return FontEntry(
+        path=path,
+        name=font_name(path),
+        family=face.familyName.decode("latin-1"),
+        bold=bool(face.flags & 1 << 18) or "bold" in style,  # ForceBold
+        italic=bool(face.flags & 1 << 6) or bool(face.italicAngle)
+        or "italic" in style or "oblique" in style,
+    )
+
+
+def _load_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data.get("fonts", {}) if data.get("version") == FONT_CACHE_VERSION else {}
+
+
+def _save_index(index, cache_dir):
+    with atomic_write(os.path.join(cache_dir, INDEX_FILE)) as f:
+        json.dump({"version": FONT_CACHE_VERSION, "fonts": index}, f)
+
+
+def scan_font_dir(directory, workers=None, cache_dir=FONT_CACHE_DIR):
+    """Describe every font under directory; returns (entries, errors).
+
+    Files whose size and mtime match the index are not opened at all.
+    """
+    paths = sorted(os.path.join(root, name)
+                   for root, _, names in os.walk(os.path.abspath(directory))
+                   for name in names if name.lower().endswith(FONT_EXTENSIONS))
+    index = _load_index(cache_dir)
+    entries, errors, todo = {}, {}, []
+    for path in paths:
+        st = os.stat(path)
+        record = index.get(path)
+        if record and (record["size"], record["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+            if "error" in record:
+                errors[path] = record["error"]
+            else:
+                entries[path] = FontEntry(**record["font"])
+        else:
+            todo.append(path)
+
+    workers = min(workers or os.cpu_count() or 1, len(todo))
+    if workers > 1:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=ctx) as pool:
+            futures = {path: pool.submit(_describe, path, cache_dir) for path in todo}
+        results = {path: future.exception() or future.result() for path, future in futures.items()}
+    else:
+        results = {}
+        for path in todo:
+            try:
+                results[path] = _describe(path, cache_dir)
+            except Exception as e:
+                results[path] = e
+
+    for path, result in results.items():
+        st = os.stat(path)
+        index[path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        if isinstance(result, BaseException):  # remembered so bad files are not re-parsed
+            errors[path] = index[path]["error"] = str(result)
+        else:
+            entries[path] = result
+            index[path]["font"] = asdict(result)
+    if results:
+        _save_index(index, cache_dir)
+    return [entries[path] for path in paths if path in entries], errors
+
+
+def group_families(entries):
+    # family -> {(bold, italic): font name}; the first face found for a slot wins
+    families = {}
+    for entry in entries:
+        families.setdefault(entry.family, {}).setdefault((entry.bold, entry.italic), entry.name)
+    return families
+
+
+def register_font_dir(directory, workers=None, cache_dir=FONT_CACHE_DIR):
+    """Register every font under directory and its families.
+
+    Fonts are declared, not loaded; see declare_font(). Returns (entries,
+    errors) as scan_font_dir() does.
+    """
+    entries, errors = scan_font_dir(directory, workers, cache_dir)
+    register_fonts(((entry.name, entry.path) for entry in entries), cache_dir)
+    for family, styles in group_families(entries).items():
+        normal = styles.get((False, False)) or next(iter(styles.values()))
+        pdfmetrics.registerFontFamily(family, normal=normal, bold=styles.get((True, False)),
+                                      italic=styles.get((False, True)),
+                                      boldItalic=styles.get((True, True)))
+    return entries, errors
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    workers = None
+    if "--workers" in argv:
+        i = argv.index("--workers")
+        workers = int(argv[i + 1])
+        argv = argv[:i] + argv[i + 2:]
+    if len(argv) != 1:
+        print("usage: python -m kdp.fonts FONT_DIR [--workers N]", file=sys.stderr)
+        return 2
+
+    entries, errors = scan_font_dir(argv[0], workers)
+    for family, styles in sorted(group_families(entries).items()):
+        print(f"{family}: " + ", ".join(sorted(styles.values())))
+    for path, error in errors.items():
+        print(f"{path}: {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
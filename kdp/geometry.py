@@ -0,0 +1,37 @@
+"""
+Vectorised ruling geometry.
+
+Coordinates for lines, grids and dot grids are computed as NumPy arrays and
+serialised to PDF path operators in bulk: each distinct coordinate is
+formatted once and the operator text is assembled with a single join, rather
+than issuing one canvas call per primitive.
+"""
+
+import numpy as np
+
+
+def axis(start, stop, spacing):
+    # Positions from start towards stop (inclusive) at the given pitch
+    count = int(np.floor(abs(stop - start) / spacing + 1e-9)) + 1
+    return start + np.copysign(spacing, stop - start) * np.arange(count)
+
+
+def format_coords(values):
+    return np.char.mod("%.2f", np.asarray(values, dtype=float)).tolist()
+
+
+def hline_operators(x0, x1, ys):
+    left, right = format_coords((x0, x1))
+    return "\n".join([f"{left} {y} m {right} {y} l" for y in format_coords(ys)])
+
+
+def vline_operators(xs, y0, y1):
+    bottom, top = format_coords((y0, y1))
+    return "\n".join([f"{x} {bottom} m {x} {top} l" for x in format_coords(xs)])
+
+
+def dot_operators(xs, ys):
+    # Dots are zero-length strokes; draw with a round line cap
+    xs, ys = format_coords(xs), format_coords(ys)
+    points = [f"{x} {y}" for y in ys for x in xs]
+    return "\n".join([f"{p} m {p} l" for p in points])
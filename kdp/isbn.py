@@ -0,0 +1,343 @@
+"""
+ISBN-13 validation, generation, hyphenation and EAN-13 barcodes.
+
+ISBNs are handled as an (N, 13) matrix of digits, so validating a list,
+computing check digits or expanding a purchased block into every ISBN in
+it is a few NumPy operations however many there are:
+
+    python -m kdp.isbn 978-1-23456 --count 1000
+
+Hyphenation needs the registration group and registrant ranges published
+by ISBN International in RangeMessage.xml, which changes as ranges are
+assigned, so none are built in: put the current file at RANGE_FILE (or load
+one with Ranges.from_xml()). An ISBN whose group and registrant ranges are
+not known exactly is left unhyphenated, never split at a guessed position.
+
+draw_barcode() places an EAN-13 symbol (with the human-readable digits and
+the ISBN above it) on a reportlab canvas as a form XObject, built once per
+ISBN per document; the bar geometry itself is cached per process.
+"""
+
+import dataclasses
+import os
+import sys
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+
+import numpy as np
+from reportlab.lib.units import mm
+
+PREFIXES = (978, 979)
+_WEIGHTS = np.array([1, 3] * 6)
+
+# ISBN International's range data; download it from isbn-international.org
+RANGE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "kdp_suite", "RangeMessage.xml")
+
+# EAN-13 symbol encoding: L-code per digit, R is its complement, G is R reversed
+_L_CODES = ("0001101", "0011001", "0010011", "0111101", "0100011",
+            "0110001", "0101111", "0111011", "0110111", "0001011")
+_R_CODES = tuple(code.translate(str.maketrans("01", "10")) for code in _L_CODES)
+_G_CODES = tuple(code[::-1] for code in _R_CODES)
+_PARITY = ("LLLLLL", "LLGLGG", "LLGGLG", "LLGGGL", "LGLLGG",
+           "LGGLLG", "LGGGLL", "LGLGLG", "LGLGGL", "LGGLGL")
+
+MODULE = 0.33 * mm  # nominal (100%) EAN-13 bar module
+BAR_HEIGHT = 22.85 * mm
+QUIET_LEFT, QUIET_RIGHT = 11, 7  # modules
+
+
+def digit_matrix(isbns):
+    """(digits, ok): an (N, 13) int array and a mask of well-formed rows.
+
+    Hyphens and spaces are ignored; rows that are not 13 digits are
+    flagged in ok (their digits are meaningless).
+    """
+    isbns = list(isbns)
+    # Fast path: strip separators from one joined string and reshape it
+    joined = "\n".join(isbns).replace("-", "").replace(" ", "") + "\n"
+    raw = np.frombuffer(joined.encode("ascii", "replace"), dtype=np.uint8)
+    if raw.size == 14 * len(isbns) and (raw[13::14] == 10).all():
+        digits = raw.reshape(-1, 14)[:, :13].astype(np.int64) - 48
+        lengths = np.full(len(isbns), 13)
+    else:
+        cleaned = [isbn.replace("-", "").replace(" ", "").encode("ascii", "replace")
+                   for isbn in isbns]
+        raw = np.array(cleaned, dtype="S13").reshape(-1)
+        digits = raw.view(np.uint8).reshape(-1, 13).astype(np.int64) - 48
+        lengths = np.fromiter(map(len, cleaned), dtype=np.int64, count=len(cleaned))
+    ok = (lengths == 13) & ((digits >= 0) & (digits <= 9)).all(axis=1)
+    return digits, ok
+
+
+def check_digits(digits12):
+    # ISBN-13 / EAN-13 check digit for each row of 12 digits
+    return (10 - np.asarray(digits12) @ _WEIGHTS % 10) % 10
+
+
+def _valid(digits, ok):
+    prefix = digits[:, 0] * 100 + digits[:, 1] * 10 + digits[:, 2]
+    return ok & np.isin(prefix, PREFIXES) & (check_digits(digits[:, :12]) == digits[:, 12])
+
+
+def validate(isbns):
+    """Boolean array: True where the ISBN-13 is well-formed with a valid check digit."""
+    return _valid(*digit_matrix(isbns))
+
+
+def _to_strings(digits):
+    return (digits.astype(np.uint8) + 48).view("S13").reshape(-1).astype("U13")
+
+
+def isbn_block(prefix, count=None, start=0):
+    """Every ISBN in the block starting with prefix (e.g. "978-1-23456").
+
+    Returns a NumPy array of 13-digit strings, title numbers start to
+    start + count; count defaults to the rest of the block.
+    """
+    head = prefix.replace("-", "").replace(" ", "")
+    if not head.isdigit() or not 3 <= len(head) <= 12 or int(head[:3]) not in PREFIXES:
+        raise ValueError(f"Not an ISBN-13 prefix: {prefix}")
+    width = 12 - len(head)
+    capacity = 10 ** width
+    count = capacity - start if count is None else count
+    if start < 0 or count < 0 or start + count > capacity:
+        raise ValueError(f"Block {prefix} holds {capacity} ISBNs; "
+                         f"cannot take {count} from title {start}")
+
+    titles = np.arange(start, start + count, dtype=np.int64)
+    digits = np.empty((count, 13), dtype=np.int64)
+    digits[:, :len(head)] = np.frombuffer(head.encode(), dtype=np.uint8) - 48
+    digits[:, len(head):12] = titles[:, None] // 10 ** np.arange(width - 1, -1, -1) % 10
+    digits[:, 12] = check_digits(digits[:, :12])
+    return _to_strings(digits)
+
+
+def normalize(isbn):
+    """Return isbn as 13 digits; ISBN-10s are converted. Raises ValueError."""
+    code = isbn.replace("-", "").replace(" ", "").upper()
+    if len(code) == 10 and code[:9].isdigit() and (code[9].isdigit() or code[9] == "X"):
+        total = sum((10 - i) * int(d) for i, d in enumerate(code[:9]))
+        if (total + (10 if code[9] == "X" else int(code[9]))) % 11:
+            raise ValueError(f"Invalid ISBN-10 check digit: {isbn}")
+        body = "978" + code[:9]
+        return body + str(int(check_digits(np.frombuffer(body.encode(), np.uint8) - 48)))
+    if not validate([code])[0]:
+        raise ValueError(f"Invalid ISBN-13: {isbn}")
+    return code
+
+
+class Ranges:
+    """Compiled group and registrant range tables for vectorised lookups."""
+
+    def __init__(self, groups, registrants):
+        # Flatten each table into sorted keys so one searchsorted does a lookup
+        self.groups = self._compile(
+            (int(prefix) * 10 ** 7, rules) for prefix, rules in groups.items())
+        self.registrants = self._compile(
+            (self._agency(int(name[:3]), name[4:]) * 10 ** 7, rules)
+            for name, rules in registrants.items())
+
+    @staticmethod
+    def _agency(prefix, group):
+        # Unique integer per registration group: prefix, group length, group number
+        return (prefix * 10 + len(group)) * 10 ** 5 + int(group)
+
+    @staticmethod
+    def _compile(tables):
+        rows = sorted((base + lo, base + hi, length)
+                      for base, rules in tables for lo, hi, length in rules)
+        return tuple(np.array(column, dtype=np.int64) for column in zip(*rows)) if rows else None
+
+    @staticmethod
+    def _lookup(table, keys):
+        if table is None:
+            return np.zeros(len(keys), dtype=np.int64)
+        lo, hi, length = table
+        i = np.clip(np.searchsorted(lo, keys, side="right") - 1, 0, None)
+        return np.where((keys >= lo[i]) & (keys <= hi[i]), length[i], 0)
+
+    @classmethod
+    def from_xml(cls, path):
+        """Load ISBN International's RangeMessage.xml.
+
+        Rules of length 0 (ranges not yet assigned) are kept, so ISBNs in
+        them stay unhyphenated.
+        """
+        root = ET.parse(path).getroot()
+
+        def rules(node):
+            parsed = []
+            for rule in node.iter("Rule"):
+                lo, hi = rule.findtext("Range").split("-")
+                parsed.append((int(lo), int(hi), int(rule.findtext("Length"))))
+            return parsed
+
+        groups = {node.findtext("Prefix"): rules(node) for node in root.iter("EAN.UCC")}
+        registrants = {node.findtext("Prefix"): rules(node) for node in root.iter("Group")}
+        return cls(groups, registrants)
+
+    def split(self, digits):
+        """Group and registrant element lengths for each row of an (N, 13) digit array."""
+        place = 10 ** np.arange(6, -1, -1)
+        prefix = digits[:, :3] @ np.array([100, 10, 1])
+        group_len = self._lookup(self.groups, prefix * 10 ** 7 + digits[:, 3:10] @ place)
+
+        # The group number and the 7 digits that follow it, padded with zeros
+        padded = np.concatenate([digits[:, :12], np.zeros((len(digits), 5), np.int64)], axis=1)
+        cols = np.arange(5)
+        in_group = cols < group_len[:, None]
+        group = (np.where(in_group, padded[:, 3:8], 0)
+                 * 10 ** np.clip(group_len[:, None] - 1 - cols, 0, None)).sum(axis=1)
+        rows = np.arange(len(digits))[:, None]
+        rest = padded[rows, 3 + group_len[:, None] + np.arange(7)]
+        rest = np.where(3 + group_len[:, None] + np.arange(7) < 12, rest, 0) @ place
+
+        agency = (prefix * 10 + group_len) * 10 ** 5 + group
+        reg_len = self._lookup(self.registrants, agency * 10 ** 7 + rest)
+        return group_len, np.where(group_len > 0, reg_len, 0)
+
+
+@lru_cache(maxsize=None)
+def default_ranges(path=RANGE_FILE):
+    # RANGE_FILE when it is installed, otherwise no ranges (nothing is hyphenated)
+    try:
+        return Ranges.from_xml(path)
+    except (OSError, ET.ParseError):
+        return Ranges({}, {})
+
+
+def hyphenate(isbns, ranges=None):
+    """Hyphenated form of each valid ISBN-13 (invalid entries raise ValueError).
+
+    ranges defaults to default_ranges(). ISBNs outside the known group or
+    registrant ranges come back as plain 13 digits.
+    """
+    isbns = list(isbns)
+    digits, ok = digit_matrix(isbns)
+    valid = _valid(digits, ok)
+    if not valid.all():
+        bad = [isbns[i] for i in np.flatnonzero(~valid)[:5]]
+        raise ValueError(f"Invalid ISBN-13: {', '.join(bad)}")
+    group_len, reg_len = (ranges or default_ranges()).split(digits)
+    group_len = np.where(reg_len > 0, group_len, 0)
+
+    # Rows sharing element lengths share hyphen positions: scatter each
+    # such set of rows into a character matrix in one step
+    chars = (digits + 48).astype(np.uint8)
+    out = np.empty(len(digits), dtype=object)
+    layouts = group_len * 10 + reg_len
+    for layout in np.unique(layouts):
+        rows = np.flatnonzero(layouts == layout)
+        g, r = divmod(int(layout), 10)
+        if not g:
+            out[rows] = _to_strings(digits[rows]).tolist()
+            continue
+        # Hyphens go before these character positions
+        cuts = [3, 3 + g, 3 + g + r, 12]
+        dest = np.arange(13) + np.searchsorted(cuts, np.arange(13), side="right")
+        text = np.full((len(rows), 13 + len(cuts)), ord("-"), dtype=np.uint8)
+        text[:, dest] = chars[rows]
+        out[rows] = text.view(f"S{13 + len(cuts)}").reshape(-1).astype(str)
+    return out.tolist()
+
+
+def assign_isbns(configs, prefix, start=0):
+    """Give every BookConfig without an ISBN the next unused ISBN in the block."""
+    used = {normalize(config.isbn) for config in configs if config.isbn}
+    needed = sum(not config.isbn for config in configs)
+    block = iter(isbn for isbn in isbn_block(prefix, start=start).tolist() if isbn not in used)
+    try:
+        return [config if config.isbn else dataclasses.replace(config, isbn=next(block))
+                for config in configs]
+    except StopIteration:
+        raise ValueError(f"Block {prefix} has fewer than {needed} unused ISBNs "
+                         f"from title {start}") from None
+
+
+@lru_cache(maxsize=4096)
+def ean13_modules(isbn):
+    # The 95-module bar pattern as a string of 0/1
+    code = normalize(isbn)
+    left = "".join((_L_CODES if p == "L" else _G_CODES)[int(d)]
+                   for p, d in zip(_PARITY[int(code[0])], code[1:7]))
+    right = "".join(_R_CODES[int(d)] for d in code[7:])
+    return "101" + left + "01010" + right + "101"
+
+
+_GUARDS = set(range(0, 3)) | set(range(45, 50)) | set(range(92, 95))
+
+
+@lru_cache(maxsize=4096)
+def barcode_operators(isbn, module=MODULE, height=BAR_HEIGHT, text_height=None):
+    """PDF operators for the bars of isbn's EAN-13 symbol, and its bbox.
+
+    Bars are filled in DeviceGray black, so the symbol is valid in RGB and
+    CMYK books alike. Guard bars extend into the digit row.
+    """
+    text_height = 9 * module / MODULE if text_height is None else text_height
+    bottom = text_height  # normal bars start above the human-readable digits
+    guard_bottom = bottom - 5 * module
+    ops = ["0 g"]
+    pattern = ean13_modules(isbn)
+    start = None
+    for i, bit in enumerate(pattern + "0"):
+        if bit == "1" and start is None:
+            start = i
+        elif bit != "1" and start is not None:
+            y = guard_bottom if start in _GUARDS else bottom
+            x = (QUIET_LEFT + start) * module
+            ops.append("%.3f %.3f %.3f %.3f re" % (x, y, (i - start) * module,
+                                                   bottom + height - y))
+            start = None
+    ops.append("f")
+    width = (QUIET_LEFT + 95 + QUIET_RIGHT) * module
+    return "\n".join(ops), (0, 0, width, bottom + height + text_height * 1.6)
+
+
+def draw_barcode(c, isbn, x, y, font_name, module=MODULE):
+    """Place isbn's EAN-13 symbol on canvas c with its lower-left corner at x, y.
+
+    font_name must be a registered TrueType font, so the digits are
+    embedded; KDP rejects documents with non-embedded fonts.
+    """
+    code = normalize(isbn)
+    name = f"ean13_{code}_{module:.4f}_{font_name}"
+    ops, bbox = barcode_operators(code, module)
+    if not c.hasForm(name):
+        size = 9 * module / MODULE
+        c.beginForm(name, *bbox)
+        c.addLiteral(ops)
+        c.setFillGray(0)
+        c.setFont(font_name, size)
+        # Human-readable digits: first digit in the quiet zone, then 6 + 6
+        c.drawRightString((QUIET_LEFT - 1) * module, 0.15 * size, code[0])
+        c.drawCentredString((QUIET_LEFT + 24) * module, 0.15 * size, code[1:7])
+        c.drawCentredString((QUIET_LEFT + 70) * module, 0.15 * size, code[7:])
+        c.drawCentredString(bbox[2] / 2, bbox[3] - size, "ISBN " + hyphenate([code])[0])
+        c.endForm()
+    c.saveState()
+    c.translate(x, y)
+    c.doForm(name)
+    c.restoreState()
+    return bbox[2], bbox[3]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = None
+    if "--count" in argv:
+        i = argv.index("--count")
+        count = int(argv[i + 1])
+        argv = argv[:i] + argv[i + 2:]
+    if len(argv) != 1:
+        print("usage: python -m kdp.isbn PREFIX [--count N]", file=sys.stderr)
+        return 2
+
+    block = isbn_block(argv[0], count)
+    for isbn in hyphenate(block.tolist()):
+        print(isbn)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
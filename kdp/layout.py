@@ -0,0 +1,58 @@
+"""
+Page geometry shared by every page of a run.
+
+All interior pages of a book have the same geometry, and so do most books in
+a batch. page_layout() derives it once per unique key (page size, margins
+and line spacing) and keeps it in a process-wide LRU cache, so repeated
+pages, batch jobs and regenerations in one session reuse the same object.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+from reportlab.lib.units import inch
+
+from . import geometry
+
+
+@dataclass(frozen=True, eq=False)
+class PageLayout:
+    # All values in points; boxes are (x0, y0, x1, y1) in trim coordinates
+    width: float
+    height: float
+    spacing: float
+    live_area: tuple
+    trim_box: tuple  # also the page and bleed box: interiors do not bleed
+    rows: np.ndarray  # ruling y positions, top to bottom
+    cols: np.ndarray  # ruling x positions, left to right
+
+
+def layout_key(config):
+    return (config.page_size, config.margins, config.line_spacing * inch)
+
+
+@lru_cache(maxsize=128)
+def page_layout(page_size, margins, spacing):
+    width, height = page_size
+    top, bottom, left, right = margins
+    x0, y0, x1, y1 = left, bottom, width - right, height - top
+
+    rows = geometry.axis(y1, y0, spacing)
+    cols = geometry.axis(x0, x1, spacing)
+    # Cached arrays are shared between callers, so make them read-only
+    rows.flags.writeable = cols.flags.writeable = False
+
+    return PageLayout(
+        width=width,
+        height=height,
+        spacing=spacing,
+        live_area=(x0, y0, x1, y1),
+        trim_box=(0, 0, width, height),
+        rows=rows,
+        cols=cols,
+    )
+
+
+def layout_for(config):
+    return page_layout(*layout_key(config))
@@ -0,0 +1,225 @@
+"""
+Build instrumentation: wall time, CPU time and allocations per stage, and
+latency histograms, exported as JSON or Prometheus text.
+
+Renderers take an optional Metrics and wrap each stage in metrics.stage();
+the default NULL_METRICS makes that a no-op, so uninstrumented runs pay
+nothing. Allocation tracking uses tracemalloc, which slows allocation-heavy
+code down noticeably, so it is opt-in.
+
+    python -m kdp.render spec.json out.pdf --metrics out.prom [--allocations]
+"""
+
+import json
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# Histogram bucket upper bounds in seconds; a final +Inf bucket is implied
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PROMETHEUS_EXTENSIONS = (".prom", ".txt")
+
+
+@dataclass(slots=True)
+class StageStats:
+    calls: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0  # of the thread that ran the stage
+    alloc_bytes: int = 0  # net growth of traced memory
+    peak_bytes: int = 0  # highest traced memory above the stage's starting point
+
+
+@dataclass(slots=True)
+class Histogram:
+    bounds: tuple
+    counts: list = field(default_factory=list)  # per bucket, the last one is +Inf
+    total: float = 0.0
+
+    def __post_init__(self):
+        self.counts = self.counts or [0] * (len(self.bounds) + 1)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def cumulative(self):
+        running, out = 0, []
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            running += count
+            out.append((bound, running))
+        return out
+
+
+class _NullMetrics:
+    # Stand-in when the caller does not want measurements
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    @contextmanager
+    def timed(self, name):
+        yield
+
+    def observe(self, name, value):
+        pass
+
+
+NULL_METRICS = _NullMetrics()
+
+
+class Metrics:
+    """Stage and histogram measurements for one build or batch.
+
+    Not thread-safe: stages may nest, but must not run concurrently on two
+    threads against the same object. Worker processes keep their own
+    Metrics and the parent merge()s their to_dict().
+    """
+
+    def __init__(self, trace_allocations=False, buckets=LATENCY_BUCKETS):
+        self.stages = {}
+        self.histograms = {}
+        self.buckets = tuple(buckets)
+        self.trace_allocations = trace_allocations
+        self._owns_trace = trace_allocations and not tracemalloc.is_tracing()
+        if self._owns_trace:
+            tracemalloc.start()
+        self._peaks = []  # running traced peak of each open stage
+
+    def close(self):
+        if self._owns_trace:
+            tracemalloc.stop()
+            self._owns_trace = False
+
+    @contextmanager
+    def stage(self, name):
+        tracing = self.trace_allocations and tracemalloc.is_tracing()
+        if tracing:
+            start_mem, peak = tracemalloc.get_traced_memory()
+            # Hand the peak so far to the enclosing stage before resetting it
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            tracemalloc.reset_peak()
+            self._peaks.append(start_mem)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.calls += 1
+            stats.wall += wall
+            stats.cpu += cpu
+            if tracing:
+                end_mem, peak = tracemalloc.get_traced_memory()
+                peak = max(self._peaks.pop(), peak)
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+                stats.alloc_bytes += end_mem - start_mem
+                stats.peak_bytes = max(stats.peak_bytes, peak - start_mem)
+
+    def observe(self, name, value):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    @contextmanager
+    def timed(self, name):
+        # Observe the wall time of the block in histogram name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    # Export
+
+    def to_dict(self):
+        stages = {}
+        for name, stats in self.stages.items():
+            stage = {"calls": stats.calls, "wall_seconds": stats.wall, "cpu_seconds": stats.cpu}
+            if self.trace_allocations:
+                stage.update(alloc_bytes=stats.alloc_bytes, peak_bytes=stats.peak_bytes)
+            stages[name] = stage
+        histograms = {
+            name: {
+                "buckets": [["+Inf" if bound == float("inf") else bound, count]
+                            for bound, count in histogram.cumulative()],
+                "count": sum(histogram.counts),
+                "sum": histogram.total,
+            }
+            for name, histogram in self.histograms.items()
+        }
+        return {"stages": stages, "histograms": histograms}
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    def merge(self, data, prefix=""):
+        """Add another Metrics' to_dict() (e.g. from a worker) into this one.
+
+        prefix is put in front of the merged stage names, to keep a worker's
+        stages apart from same-named stages of the parent.
+        """
+        for name, stage in data.get("stages", {}).items():
+            stats = self.stages.setdefault(prefix + name, StageStats())
+            stats.calls += stage["calls"]
+            stats.wall += stage["wall_seconds"]
+            stats.cpu += stage["cpu_seconds"]
+            stats.alloc_bytes += stage.get("alloc_bytes", 0)
+            stats.peak_bytes = max(stats.peak_bytes, stage.get("peak_bytes", 0))
+        for name, hist in data.get("histograms", {}).items():
+            bounds = tuple(bound for bound, _ in hist["buckets"][:-1])
+            histogram = self.histograms.setdefault(name, Histogram(bounds))
+            if histogram.bounds != bounds:
+                raise ValueError(f"Histogram {name} has different buckets")
+            previous = 0
+            for i, (_, count) in enumerate(hist["buckets"]):
+                histogram.counts[i] += count - previous
+                previous = count
+            histogram.total += hist["sum"]
+
+    def to_prometheus(self, prefix="kdp"):
+        """The measurements in the Prometheus text exposition format."""
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            lines.extend(f"{prefix}_{name}{labels} {value!r}" for labels, value in samples)
+
+        def per_stage(attr):
+            return [(f'{{stage="{name}"}}', getattr(stats, attr))
+                    for name, stats in sorted(self.stages.items())]
+
+        if self.stages:
+            family("stage_calls_total", "counter", "Times each stage ran.", per_stage("calls"))
+            family("stage_wall_seconds_total", "counter", "Wall-clock time spent in each stage.",
+                   per_stage("wall"))
+            family("stage_cpu_seconds_total", "counter", "CPU time spent in each stage.",
+                   per_stage("cpu"))
+            if self.trace_allocations:
+                family("stage_alloc_bytes", "gauge", "Net traced memory growth over each stage.",
+                       per_stage("alloc_bytes"))
+                family("stage_peak_bytes", "gauge", "Peak traced memory above each stage's start.",
+                       per_stage("peak_bytes"))
+        for name, histogram in sorted(self.histograms.items()):
+            samples = [(f'_bucket{{le="{"+Inf" if bound == float("inf") else repr(bound)}"}}', count)
+                       for bound, count in histogram.cumulative()]
+            samples += [("_sum", histogram.total), ("_count", sum(histogram.counts))]
+            family(name, "histogram", f"Distribution of {name.replace('_', ' ')}.", samples)
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # Prometheus text for .prom/.txt files, JSON otherwise
+        with open(path, "w") as f:
+            if path.lower().endswith(PROMETHEUS_EXTENSIONS):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), f, indent=2)
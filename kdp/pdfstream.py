@@ -0,0 +1,113 @@
+"""
+Minimal streaming PDF writer.
+
+reportlab's Canvas keeps every finished page in memory until save(). This
+writer emits each object as soon as it is added and only remembers byte
+offsets, so peak memory stays flat no matter how many pages are written.
+The page tree, catalog and cross-reference table are written on close().
+"""
+
+import zlib
+from array import array
+
+CATALOG, PAGES = 1, 2
+
+
+def pdf_string(text):
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return "(" + escaped + ")"
+
+
+class StreamingPDFWriter:
+    def __init__(self, output, compress=True):
+        if hasattr(output, "write"):
+            self._file, self._owns_file = output, False
+        else:
+            self._file, self._owns_file = open(output, "wb"), True
+        self.compress = compress
+        self._pos = 0
+        # offsets[n - 1] is the byte offset of object n; 0 means not yet written
+        self._offsets = array("Q", [0, 0])
+        self._kids = array("L")
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write(self, data):
+        self._file.write(data)
+        self._pos += len(data)
+
+    def _emit(self, num, body):
+        self._offsets[num - 1] = self._pos
+        self._write(b"%d 0 obj\n" % num + body + b"\nendobj\n")
+
+    def reserve(self):
+        self._offsets.append(0)
+        return len(self._offsets)
+
+    def add_object(self, body, num=None):
+        num = num or self.reserve()
+        self._emit(num, body.encode("latin-1") if isinstance(body, str) else body)
+        return num
+
+    def add_stream(self, data, entries="", compress=None):
+        if isinstance(data, str):
+            data = data.encode("latin-1")
+        if self.compress if compress is None else compress:
+            data = zlib.compress(data)
+            entries += " /Filter /FlateDecode"
+        head = "<< %s /Length %d >>\nstream\n" % (entries.strip(), len(data))
+        return self.add_object(head.encode("latin-1") + data + b"\nendstream")
+
+    def add_form(self, content, bbox, resources="<< >>"):
+        entries = "/Type /XObject /Subtype /Form /BBox [%s] /Resources %s" % (
+            " ".join("%.4f" % v for v in bbox), resources)
+        return self.add_stream(content, entries)
+
+    def add_pattern(self, content, step, matrix=(1, 0, 0, 1, 0, 0), resources="<< >>"):
+        # Coloured tiling pattern whose cell is a step x step square
+        entries = ("/Type /Pattern /PatternType 1 /PaintType 1 /TilingType 1 "
+                   "/BBox [0 0 %.4f %.4f] /XStep %.4f /YStep %.4f /Matrix [%s] /Resources %s" % (
+                       step, step, step, step, " ".join("%.4f" % v for v in matrix), resources))
+        return self.add_stream(content, entries)
+
+    def add_page(self, content, mediabox, resources="<< >>", boxes=""):
+        # Tiny per-page streams grow under Flate, so leave them uncompressed
+        contents = self.add_stream(content, compress=self.compress and len(content) > 256)
+        page = self.add_object(
+            "<< /Type /Page /Parent %d 0 R /MediaBox [%s] %s/Resources %s /Contents %d 0 R >>" % (
+                PAGES, " ".join("%.4f" % v for v in mediabox), boxes, resources, contents))
+        self._kids.append(page)
+        self._file.flush()
+        return page
+
+    @property
+    def page_count(self):
+        return len(self._kids)
+
+    def close(self, info=None):
+        kids = " ".join("%d 0 R" % k for k in self._kids)
+        self.add_object("<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._kids)), PAGES)
+        self.add_object("<< /Type /Catalog /Pages %d 0 R >>" % PAGES, CATALOG)
+        info_ref = ""
+        if info:
+            entries = " ".join("/%s %s" % (k, pdf_string(v)) for k, v in info.items())
+            info_ref = " /Info %d 0 R" % self.add_object("<< %s >>" % entries)
+
+        xref_pos = self._pos
+        size = len(self._offsets) + 1
+        lines = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+        lines.extend(b"%010d 00000 n \n" % off for off in self._offsets)
+        self._write(b"".join(lines))
+        self._write(("trailer\n<< /Size %d /Root %d 0 R%s >>\nstartxref\n%d\n%%%%EOF\n" % (
+            size, CATALOG, info_ref, xref_pos)).encode("latin-1"))
+        self._file.flush()
+        if self._owns_file:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._owns_file:
+            self._file.close()
@@ -0,0 +1,488 @@
+"""
+Preflight of a generated PDF (requires pypdf).
+
+Every page of the output is checked against KDP's rules: page boxes, font
+embedding and subsetting, effective image resolution, colour spaces, and
+whether all marks sit inside the safe zone (outside margin plus the gutter
+for the page count). A full-wrap cover (cover=True) is checked against its
+own layout instead: the wrap's trim and bleed boxes, and text kept inside
+the back, spine and front panels; artwork is meant to run into the bleed.
+
+Results are cached on disk per page, keyed by a hash of the page's content
+stream, the resources it uses and the check parameters. Ruled interiors
+repeat the same page hundreds of times, and an edited book usually changes
+only a few pages, so re-preflighting touches almost nothing. Pages whose key
+is not cached are checked in parallel worker processes. Each key is its own
+small file, so concurrent runs never overwrite each other's results, and
+the cache is pruned to CACHE_MAX_BYTES, least recently used first.
+
+    python -m kdp.preflight output.pdf spec.json [--cover]
+"""
+
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import repeat
+
+from pypdf import PdfReader
+from pypdf.generic import ContentStream, IndirectObject
+from reportlab.lib.units import inch
+
+from .config import BookConfig
+from .covers import PRINT_DPI
+from .fileio import atomic_write, prune_lru
+from .spine import SPINE_TEXT_MARGIN, page_limits
+from .wrap import cover_layout
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "kdp_suite", "preflight")
+CACHE_MAX_BYTES = 64 << 20
+_ENTRY_NAME = re.compile(r"^[0-9a-f]{64}\.json$")
+CHECK_VERSION = 3  # bump when checks change so stale cache entries are ignored
+
+SAFE_MARGIN = 0.25 * inch
+COVER_SAFE_MARGIN = 0.125 * inch  # cover text clear of the trim edges
+# KDP minimum inside (gutter) margin by page count, in inches
+GUTTERS = ((150, 0.375), (300, 0.5), (500, 0.625), (700, 0.75), (828, 0.875))
+BOX_TOLERANCE = 0.5  # points
+# Marks may overhang the interior safe zone by this much: a stroke's ink
+# extends past its path by half the line width (a ruling dot's 0.75 pt
+# radius), and pattern fills are clipped to that ink
+INK_TOLERANCE = 1.0  # points
+
+_PAINT_OPS = {b"S", b"s", b"f", b"F", b"f*", b"B", b"B*", b"b", b"b*"}
+_SUBSET_NAME = re.compile(r"^/[A-Z]{6}\+")
+
+
+def gutter(page_count):
+    for limit, size in GUTTERS:
+        if page_count <= limit:
+            return size * inch
+    return GUTTERS[-1][1] * inch
+
+
+@dataclass(frozen=True, slots=True)
+class PageReport:
+    page: int
+    issues: tuple = ()
+    cached: bool = False
+
+    @property
+    def ok(self):
+        return not self.issues
+
+
+@dataclass(slots=True)
+class PreflightReport:
+    path: str
+    pages: list = field(default_factory=list)
+    issues: list = field(default_factory=list)  # document-level
+
+    @property
+    def ok(self):
+        return not self.issues and all(page.ok for page in self.pages)
+
+    def summary(self):
+        lines = list(self.issues)
+        lines.extend(f"Page {p.page}: {issue}" for p in self.pages for issue in p.issues)
+        return lines
+
+
+def _multiply(m, n):
+    a, b, c, d, e, f = m
+    A, B, C, D, E, F = n
+    return (a * A + b * C, a * B + b * D, c * A + d * C, c * B + d * D,
+            e * A + f * C + E, e * B + f * D + F)
+
+
+class _PageChecker:
+    # Walks a page's content, tracking the CTM, painted extents and resources
+
+    def __init__(self, reader, params):
+        self.reader = reader
+        self.params = params
+        self.issues = []
+        self.bbox = None
+        self.text = []  # (x0, y0, x1, y1) per text-showing operator
+        self._fonts_seen = set()
+
+    def issue(self, text):
+        if text not in self.issues:
+            self.issues.append(text)
+
+    def extend(self, ctm, points):
+        a, b, c, d, e, f = ctm
+        for x, y in points:
+            px, py = a * x + c * y + e, b * x + d * y + f
+            if self.bbox is None:
+                self.bbox = [px, py, px, py]
+            else:
+                bb = self.bbox
+                bb[0], bb[1] = min(bb[0], px), min(bb[1], py)
+                bb[2], bb[3] = max(bb[2], px), max(bb[3], py)
+
+    def check_font(self, font):
+        # Only fonts that show text are checked; reportlab lists and selects
+        # Helvetica on every page whether or not anything is drawn with it
+        font = font.get_object()
+        base = str(font.get("/BaseFont", "/Unnamed"))
+        if base in self._fonts_seen or font.get("/Subtype") == "/Type3":
+            return
+        self._fonts_seen.add(base)
+        target = font
+        if font.get("/Subtype") == "/Type0":
+            target = font["/DescendantFonts"][0].get_object()
+        descriptor = target.get("/FontDescriptor")
+        descriptor = descriptor.get_object() if descriptor is not None else {}
+        if not any(key in descriptor for key in ("/FontFile", "/FontFile2", "/FontFile3")):
+            self.issue(f"Font {base[1:]} is not embedded")
+        elif not _SUBSET_NAME.match(base):
+            self.issue(f"Font {base[1:]} is embedded but not subset")
+
+    def vertical_extent(self, font):
+        # (descent, ascent) per unit of font size, from the font descriptor;
+        # fonts without one are taken as one em above the baseline
+        font = font.get_object()
+        if font.get("/Subtype") == "/Type0":
+            font = font["/DescendantFonts"][0].get_object()
+        descriptor = font.get("/FontDescriptor")
+        if descriptor is None:
+            return 0.0, 1.0
+        descriptor = descriptor.get_object()
+        return (float(descriptor.get("/Descent", 0)) / 1000,
+                float(descriptor.get("/Ascent", 1000)) / 1000)
+
+    def check_image(self, image, ctm):
+        a, b, c, d, _, _ = ctm
+        width_in, height_in = math.hypot(a, b) / inch, math.hypot(c, d) / inch
+        if width_in and height_in:
+            dpi = min(image["/Width"] / width_in, image["/Height"] / height_in)
+            if dpi < self.params["min_dpi"] - 0.5:
+                self.issue(f"Image prints at {dpi:.0f} DPI (minimum {self.params['min_dpi']})")
+        colorspace = image.get("/ColorSpace")
+        colorspace = colorspace.get_object() if isinstance(colorspace, IndirectObject) else colorspace
+        if isinstance(colorspace, list):
+            colorspace = colorspace[0]
+        if self.params["color_mode"] == "CMYK" and colorspace in ("/DeviceRGB", "/CalRGB"):
+            self.issue("RGB image in a CMYK book")
+        self.extend(ctm, ((0, 0), (1, 0), (0, 1), (1, 1)))
+
+    def walk(self, content, resources, ctm=(1, 0, 0, 1, 0, 0)):
+        resources = resources.get_object() if resources is not None else {}
+        if content is None:
+            return
+        cmyk = self.params["color_mode"] == "CMYK"
+        xobjects = resources.get("/XObject")
+        xobjects = xobjects.get_object() if xobjects is not None else {}
+        fonts = resources.get("/Font")
+        fonts = fonts.get_object() if fonts is not None else {}
+
+        stack = []
+        path = []
+        tm = (1, 0, 0, 1, 0, 0)
+        font_size = 0
+        font = None
+        for operands, op in content.operations:
+            if op in (b"m", b"l"):
+                path.append((operands[0], operands[1]))
+            elif op == b"re":
+                x, y, w, h = operands
+                path.extend(((x, y), (x + w, y + h)))
+            elif op == b"c":
+                path.extend(zip(operands[0::2], operands[1::2]))
+            elif op in (b"v", b"y"):
+                path.extend(((operands[0], operands[1]), (operands[2], operands[3])))
+            elif op in _PAINT_OPS:
+                self.extend(ctm, [(float(x), float(y)) for x, y in path])
+                path = []
+            elif op == b"n":
+                path = []
+            elif op == b"q":
+                stack.append(ctm)
+            elif op == b"Q":
+                ctm = stack.pop() if stack else ctm
+            elif op == b"cm":
+                ctm = _multiply([float(v) for v in operands], ctm)
+            elif op == b"BT":
+                tm = (1, 0, 0, 1, 0, 0)
+            elif op == b"Tf":
+                font, font_size = operands[0], float(operands[1])
+            elif op == b"Tm":
+                tm = tuple(float(v) for v in operands)
+            elif op in (b"Td", b"TD"):
+                tm = _multiply((1, 0, 0, 1, float(operands[0]), float(operands[1])), tm)
+            elif op in (b"Tj", b"TJ", b"'", b'"'):
+                # Text extent is approximated by its origin and the font's
+                # descent and ascent
+                low, high = 0.0, 1.0
+                if font in fonts:
+                    self.check_font(fonts[font])
+                    low, high = self.vertical_extent(fonts[font])
+                else:
+                    self.issue(f"Missing font resource {font}")
+                _, _, c, d, e, f = text_ctm = _multiply(tm, ctm)
+                xs = (e + c * low * font_size, e + c * high * font_size)
+                ys = (f + d * low * font_size, f + d * high * font_size)
+                self.text.append((min(xs), min(ys), max(xs), max(ys)))
+                self.extend(text_ctm, ((0, low * font_size), (0, high * font_size)))
+            elif cmyk and op in (b"rg", b"RG"):
+                self.issue("RGB colour operator in a CMYK book")
+            elif cmyk and op in (b"cs", b"CS") and operands[0] in ("/DeviceRGB", "/CalRGB"):
+                self.issue("RGB colour space in a CMYK book")
+            elif op == b"Do":
+                xobj = xobjects.get(operands[0])
+                if xobj is None:
+                    self.issue(f"Missing XObject {operands[0]}")
+                    continue
+                xobj = xobj.get_object()
+                if xobj.get("/Subtype") == "/Image":
+                    self.check_image(xobj, ctm)
+                elif xobj.get("/Subtype") == "/Form":
+                    matrix = [float(v) for v in xobj.get("/Matrix", (1, 0, 0, 1, 0, 0))]
+                    self.walk(ContentStream(xobj, self.reader), xobj.get("/Resources"),
+                              _multiply(matrix, ctm))
+
+
+def _box_matches(box, expected):
+    return all(abs(float(v) - w) <= BOX_TOLERANCE for v, w in zip(box, expected))
+
+
+def _size(box):
+    x0, y0, x1, y1 = (float(v) for v in box)
+    return f"{(x1 - x0) / inch:.3f}x{(y1 - y0) / inch:.3f} in"
+
+
+def _check_interior_safe_zone(checker, index, params):
+    if not checker.bbox:
+        return
+    width, height = params["media"]
+    # Page 1 is a recto: its gutter is on the left
+    recto = index % 2 == 0
+    left = params["gutter"] if recto else SAFE_MARGIN
+    right = SAFE_MARGIN if recto else params["gutter"]
+    x0, y0, x1, y1 = checker.bbox
+    if (x0 < left - INK_TOLERANCE or x1 > width - right + INK_TOLERANCE
+            or y0 < SAFE_MARGIN - INK_TOLERANCE or y1 > height - SAFE_MARGIN + INK_TOLERANCE):
+        checker.issue(f"Content outside the safe zone (needs {left / inch:.3f} in left, "
+                      f"{right / inch:.3f} in right, {SAFE_MARGIN / inch:.3f} in top/bottom)")
+
+
+def _check_cover_safe_zone(checker, params):
+    # Every piece of text must sit inside one panel's safe area
+    for tx0, ty0, tx1, ty1 in checker.text:
+        if not any(x0 - BOX_TOLERANCE <= tx0 and tx1 <= x1 + BOX_TOLERANCE
+                   and y0 - BOX_TOLERANCE <= ty0 and ty1 <= y1 + BOX_TOLERANCE
+                   for x0, y0, x1, y1 in params["safe"]):
+            checker.issue(f"Cover text outside the safe zones (needs "
+                          f"{COVER_SAFE_MARGIN / inch:.3f} in inside the trim and "
+                          f"{SPINE_TEXT_MARGIN:.4f} in from the spine folds)")
+            return
+
+
+def check_page(reader, index, params):
+    """Return the list of issues for page index (0-based)."""
+    page = reader.pages[index]
+    checker = _PageChecker(reader, params)
+    media = (0, 0, *params["media"])
+    cover = "safe" in params
+
+    if not _box_matches(page.mediabox, media):
+        checker.issue(f"MediaBox {_size(page.mediabox)} does not match "
+                      f"{'the wrap' if cover else 'trim'} {_size(media)}")
+    if "/TrimBox" not in page:
+        checker.issue("Missing TrimBox")
+    elif not _box_matches(page["/TrimBox"], params["trim_box"]):
+        checker.issue("TrimBox does not match the trim size")
+    if "/BleedBox" not in page:
+        checker.issue("Missing BleedBox")
+    elif cover and not _box_matches(page["/BleedBox"], media):
+        checker.issue("BleedBox does not match the wrap size")
+
+    checker.walk(page.get_contents(), page.get("/Resources"))
+
+    if cover:
+        _check_cover_safe_zone(checker, params)
+    else:
+        _check_interior_safe_zone(checker, index, params)
+    return checker.issues
+
+
+def _inset(box, dx, dy):
+    x0, y0, x1, y1 = box
+    return [x0 + dx, y0 + dy, x1 - dx, y1 - dy]
+
+
+def check_params(config, page_count, cover=False):
+    """The parameters page checks (and their cache keys) depend on."""
+    if not cover:
+        width, height = config.page_size
+        return {"media": [width, height], "trim_box": [0, 0, width, height],
+                "gutter": gutter(page_count), "color_mode": config.color_mode,
+                "min_dpi": PRINT_DPI}
+    layout = cover_layout(config)
+    bleed = layout.bleed
+    safe = [_inset(layout.back, COVER_SAFE_MARGIN, COVER_SAFE_MARGIN),
+            _inset(layout.spine, SPINE_TEXT_MARGIN * inch, COVER_SAFE_MARGIN),
+            _inset(layout.front, COVER_SAFE_MARGIN, COVER_SAFE_MARGIN)]
+    return {"media": [layout.width, layout.height],
+            "trim_box": [bleed, bleed, layout.width - bleed, layout.height - bleed],
+            "safe": [box for box in safe if box[0] < box[2]],  # a thin spine has none
+            "color_mode": config.color_mode, "min_dpi": PRINT_DPI}
+
+
+def _digest(obj, memo):
+    # Hash of everything a resource contributes to the checks
+    ref = obj.indirect_reference if hasattr(obj, "indirect_reference") else None
+    if isinstance(obj, IndirectObject):
+        ref, obj = obj, obj.get_object()
+    key = (ref.idnum, ref.generation) if ref is not None else None
+    if key in memo:
+        return memo[key]
+
+    h = hashlib.sha256()
+    if isinstance(obj, dict) and obj.get("/Subtype") == "/Image":
+        # Checks depend on size and colour space, not on the pixels
+        h.update(repr([obj.get(k) for k in ("/Width", "/Height", "/ColorSpace")]).encode())
+    elif isinstance(obj, dict) and obj.get("/Subtype") == "/Form":
+        h.update(obj.get_data())
+        h.update(repr(obj.get("/Matrix")).encode())
+        h.update(_digest(obj.get("/Resources", {}), memo).encode())
+    elif isinstance(obj, dict):
+        for name in sorted(obj):
+            if name in ("/Parent", "/FontFile", "/FontFile2", "/FontFile3"):
+                # Embedded font programs only matter by presence
+                h.update(name.encode())
+                continue
+            h.update(name.encode())
+            h.update(_digest(obj[name], memo).encode())
+    elif isinstance(obj, list):
+        for item in obj:
+            h.update(_digest(item, memo).encode())
+    else:
+        h.update(repr(obj).encode())
+    digest = h.hexdigest()
+    if key is not None:
+        memo[key] = digest
+    return digest
+
+
+def page_key(page, index, params, memo):
+    h = hashlib.sha256(json.dumps([CHECK_VERSION, params, index % 2], sort_keys=True).encode())
+    for name in ("/MediaBox", "/TrimBox", "/BleedBox"):
+        h.update(repr(page.get(name)).encode())
+    h.update(_digest(page.get("/Resources", {}), memo).encode())
+    content = page.get_contents()
+    if content is not None:
+        h.update(content.get_data())
+    return h.hexdigest()
+
+
+def _load_cached(cache_dir, keys):
+    # key -> issues for the keys that are cached
+    cache = {}
+    for key in set(keys):
+        path = os.path.join(cache_dir, key + ".json")
+        try:
+            with open(path) as f:
+                cache[key] = json.load(f)
+            os.utime(path)  # eviction goes by modification time
+        except (OSError, ValueError):
+            pass
+    return cache
+
+
+def _save_cached(cache_dir, fresh):
+    for key, issues in fresh.items():
+        with atomic_write(os.path.join(cache_dir, key + ".json")) as f:
+            json.dump(issues, f)
+    prune_lru(cache_dir, CACHE_MAX_BYTES, _ENTRY_NAME)
+
+
+_worker_reader = None
+
+
+def _init_worker(path):
+    global _worker_reader
+    _worker_reader = PdfReader(path)
+
+
+def _check_in_worker(index, params):
+    return check_page(_worker_reader, index, params)
+
+
+def preflight_pdf(path, config, workers=None, cache_dir=CACHE_DIR, cover=False):
+    """Check every page of path against config and return a PreflightReport.
+
+    cover=True checks path as config's full-wrap cover rather than its
+    interior. cache_dir=None checks every page without reading or filling
+    the cache.
+    """
+    reader = PdfReader(path)
+    count = len(reader.pages)
+    params = check_params(config, count, cover)
+    report = PreflightReport(path)
+    if cover:
+        if count != 1:
+            report.issues.append(f"Cover has {count} pages; KDP expects one")
+    else:
+        width, height = config.page_size
+        low, high = (int(limit[0]) for limit in page_limits([width / inch], [height / inch],
+                                                             [config.interior]))
+        if not low <= count <= high:
+            report.issues.append(f"Page count {count} is outside KDP's {low}-{high} range "
+                                 f"for this trim and interior")
+
+    memo = {}
+    keys = [page_key(page, i, params, memo) for i, page in enumerate(reader.pages)]
+    cache = _load_cached(cache_dir, keys) if cache_dir else {}
+    # One check per distinct uncached page
+    todo = {}
+    for i, key in enumerate(keys):
+        if key not in cache and key not in todo:
+            todo[key] = i
+
+    fresh = {}
+    workers = workers or os.cpu_count() or 1
+    if len(todo) > 1 and workers > 1:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo)), mp_context=context,
+                                 initializer=_init_worker, initargs=(path,)) as pool:
+            results = pool.map(_check_in_worker, todo.values(), repeat(params),
+                               chunksize=max(1, len(todo) // (workers * 4)))
+            fresh = dict(zip(todo, results))
+    else:
+        fresh = {key: check_page(reader, i, params) for key, i in todo.items()}
+
+    if fresh and cache_dir:
+        _save_cached(cache_dir, fresh)
+    for i, key in enumerate(keys):
+        if key in fresh:
+            report.pages.append(PageReport(i + 1, tuple(fresh[key])))
+        else:
+            report.pages.append(PageReport(i + 1, tuple(cache[key]), cached=True))
+    return report
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    cover = "--cover" in argv
+    argv = [arg for arg in argv if arg != "--cover"]
+    if len(argv) != 2:
+        print("usage: python -m kdp.preflight OUTPUT.pdf SPEC.json [--cover]", file=sys.stderr)
+        return 2
+    with open(argv[1]) as f:
+        config = BookConfig.from_dict(json.load(f))
+    report = preflight_pdf(argv[0], config, cover=cover)
+    for line in report.summary():
+        print(line)
+    print("Preflight passed" if report.ok else "Preflight failed")
+    return 0 if report.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Progress, throughput and cancellation channel between a renderer and its UI.
+
+The renderer runs on a worker thread and only ever puts events on a queue;
+the GUI drains it from the Tk main loop with after(), so no Tk call is made
+off the main thread. Cancellation is a threading.Event checked once per page.
+"""
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+PROGRESS, STAGE, DONE, FAILED, CANCELLED = "progress", "stage", "done", "failed", "cancelled"
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class ProgressEvent:
+    kind: str
+    page: int = 0
+    total: int = 0
+    rate: float = 0.0  # pages per second
+    eta: float = 0.0  # seconds remaining
+    stage: str = ""
+    elapsed: float = 0.0
+    message: str = ""
+
+
+class _NullProgress:
+    # Stand-in when the caller does not want progress reports
+
+    def page_done(self, page, total):
+        pass
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+
+NULL_PROGRESS = _NullProgress()
+
+
+class ProgressChannel:
+    def __init__(self, min_interval=0.05):
+        self.events = queue.Queue()
+        self.stage_times = {}
+        self.min_interval = min_interval
+        self._cancel = threading.Event()
+        self._start = time.perf_counter()
+        self._last_report = 0.0
+
+    # Renderer side
+
+    def page_done(self, page, total):
+        # Throttled: a 10,000 page run should not flood the Tk queue
+        now = time.perf_counter()
+        if page < total and now - self._last_report < self.min_interval:
+            return
+        self._last_report = now
+        elapsed = now - self._start
+        rate = page / elapsed if elapsed > 0 else 0.0
+        eta = (total - page) / rate if rate else 0.0
+        self.events.put(ProgressEvent(PROGRESS, page=page, total=total, rate=rate,
+                                      eta=eta, elapsed=elapsed))
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.stage_times[name] = self.stage_times.get(name, 0.0) + duration
+            self.events.put(ProgressEvent(STAGE, stage=name, elapsed=duration))
+
+    def finish(self, message=""):
+        self.events.put(ProgressEvent(DONE, elapsed=time.perf_counter() - self._start,
+                                      message=message))
+
+    def fail(self, message):
+        self.events.put(ProgressEvent(FAILED, message=message))
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def acknowledge_cancel(self):
+        self.events.put(ProgressEvent(CANCELLED, elapsed=time.perf_counter() - self._start))
+
+    # UI side
+
+    def cancel(self):
+        self._cancel.set()
+
+    def drain(self):
+        while True:
+            try:
+                yield self.events.get_nowait()
+            except queue.Empty:
+                return
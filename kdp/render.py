@@ -0,0 +1,394 @@
+"""
+Interior PDF rendering.
+
+render_book() turns a BookConfig into a PDF without touching any GUI state:
+
+    python -m kdp.render spec.json output.pdf [--workers N | --stream | --pattern]
+                                              [--metrics FILE.json|FILE.prom [--allocations]]
+
+With workers > 1 the page range is split into chunks that render in a process
+pool and are merged back in page order (requires pypdf). --stream uses the
+constant-memory writer in kdp.pdfstream for very long interiors, and
+--pattern fills each page with a single tiling-pattern operation. --metrics
+writes per-stage and per-page measurements (see kdp.metrics).
+"""
+
+import hashlib
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from functools import lru_cache
+
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.pdfbase import pdfdoc
+from reportlab.pdfgen import canvas
+
+from . import geometry
+from .config import BookConfig
+from .fonts import register_fonts
+from .layout import layout_for, layout_key, page_layout
+from .metrics import NULL_METRICS, Metrics
+from .pdfstream import StreamingPDFWriter
+from .progress import NULL_PROGRESS, RenderCancelled
+from .spine import check_page_count
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # only needed to merge parallel chunks
+    PdfReader = PdfWriter = None
+
+# Neutral grey as DeviceGray: prints on black ink alone and keeps interiors
+# free of RGB colour for CMYK preflight
+RULING_WIDTH = 0.5
+RULING_STROKE = "%.4f G %g w" % (colors.lightgrey.red, RULING_WIDTH)
+DOT_RADIUS = 0.75  # dots are round-capped strokes of twice this width
+DOT_STROKE = "1 J %g w" % (2 * DOT_RADIUS)
+
+# reportlab_output() swaps process-wide reportlab state; blocks take turns
+_OUTPUT_LOCK = threading.RLock()
+
+
+@contextmanager
+def reportlab_output(metrics=NULL_METRICS):
+    """Settings for the reportlab output written inside the block.
+
+    Streams are binary: ASCII85 inflates every stream by a quarter and, for
+    JPEGs that reportlab otherwise embeds untouched, costs more than the
+    copy. With metrics, the deflating reportlab does inside Canvas.save()
+    is timed as a "compress" stage of its own. Both are process-wide
+    reportlab globals, so they are restored when the block exits, and
+    blocks in different threads hold a lock: one thread's block never sees
+    or restores another's settings. Reportlab output written outside any
+    block is unaffected, except while another thread is inside one.
+    """
+    with _OUTPUT_LOCK:
+        use_a85, deflate = rl_config.useA85, pdfdoc.PDFStreamFilterZCompress.encode
+        rl_config.useA85 = 0
+        if metrics is not NULL_METRICS:
+            def timed_deflate(self, text):
+                with metrics.stage("compress"):
+                    return deflate(self, text)
+
+            pdfdoc.PDFStreamFilterZCompress.encode = timed_deflate
+        try:
+            yield
+        finally:
+            rl_config.useA85 = use_a85
+            pdfdoc.PDFStreamFilterZCompress.encode = deflate
+
+
+@contextmanager
+def _stage(progress, metrics, name):
+    with progress.stage(name), metrics.stage(name):
+        yield
+
+
+def template_name(config):
+    key = repr((config.page_style, layout_key(config)))
+    return "PageTpl" + hashlib.sha1(key.encode()).hexdigest()[:12]
+
+
+def ruling_operators(config):
+    # PDF content operators for the style's ruling, shared by both backends
+    return _ruling_operators(config.page_style, layout_key(config))
+
+
+@lru_cache(maxsize=64)
+def _ruling_operators(style, key):
+    if style == "blank":
+        return ""
+
+    layout = page_layout(*key)
+    x0, y0, x1, y1 = layout.live_area
+    rows, cols = layout.rows, layout.cols
+
+    ops = [RULING_STROKE]
+    if style in ("lined", "grid"):
+        ops.append(geometry.hline_operators(x0, x1, rows))
+    if style == "grid":
+        ops.append(geometry.vline_operators(cols, y0, y1))
+    if style == "dotted":
+        # Zero-length round-capped strokes are the most compact dot primitive
+        ops.append(DOT_STROKE)
+        ops.append(geometry.dot_operators(cols, rows))
+    ops.append("S")
+    return "\n".join(ops)
+
+
+def tiling_pattern(config):
+    """Describe the style as one pattern cell plus the rectangle it fills.
+
+    Returns (cell operators, step, pattern matrix, fill rectangle) or None
+    for blank pages. Fills reproduce the same marks as ruling_operators().
+    """
+    style = config.page_style
+    if style == "blank":
+        return None
+
+    layout = layout_for(config)
+    step = layout.spacing
+    x0, y0, x1, y1 = layout.live_area
+    rows, cols = layout.rows, layout.cols
+    half = step / 2
+
+    # The cell is centred on a ruling intersection so no mark straddles a tile edge
+    ops = [RULING_STROKE]
+    if style in ("lined", "grid"):
+        ops.append("0 %.4f m %.4f %.4f l" % (half, step, half))
+    if style == "grid":
+        ops.append("%.4f 0 m %.4f %.4f l" % (half, half, step))
+    if style == "dotted":
+        ops.append("%s %.4f %.4f m %.4f %.4f l" % (DOT_STROKE, half, half, half, half))
+    ops.append("S")
+    matrix = (1, 0, 0, 1, x0 - half, y1 - half)
+
+    # Fill only where marks are: the ruling padded by the dot radius or half
+    # the line width, never the rest of the edge cells
+    if style == "dotted":
+        rect = (cols[0] - DOT_RADIUS, rows[-1] - DOT_RADIUS,
+                cols[-1] + DOT_RADIUS, rows[0] + DOT_RADIUS)
+    elif style == "lined":
+        pad = RULING_WIDTH / 2
+        rect = (x0, rows[-1] - pad, x1, rows[0] + pad)
+    else:
+        pad = RULING_WIDTH / 2
+        rect = (x0 - pad, y0 - pad, x1 + pad, y1 + pad)
+    return "\n".join(ops), step, matrix, rect
+
+
+def build_page_template(c, config):
+    # Draw the ruling for the style/geometry once as a form XObject
+    if config.page_style == "blank":
+        return None
+    name = template_name(config)
+    if not c.hasForm(name):
+        c.beginForm(name, 0, 0, *config.page_size)
+        c.addLiteral(ruling_operators(config))
+        c.endForm()
+    return name
+
+
+def draw_page(c, page_num, template=None):
+    # Interior pages are identical, so stamp the shared form XObject
+    if template:
+        c.doForm(template)
+
+
+def _check_cancelled(cancelled):
+    if cancelled and cancelled():
+        raise RenderCancelled()
+
+
+def render_pages(config, output, pages, cancelled=None, progress=NULL_PROGRESS,
+                 metrics=NULL_METRICS):
+    # Render the given page numbers onto one canvas
+    total = len(pages)
+    # Interiors do not bleed: the page, trim and bleed boxes are one
+    box = layout_for(config).trim_box
+    c = canvas.Canvas(output, pagesize=config.page_size, trimBox=box, bleedBox=box)
+    with _stage(progress, metrics, "template"):
+        template = build_page_template(c, config)
+    with _stage(progress, metrics, "pages"):
+        for done, page in enumerate(pages, 1):
+            _check_cancelled(cancelled)
+            with metrics.timed("page_seconds"):
+                with metrics.stage("draw_page"):
+                    draw_page(c, page, template)
+                with metrics.stage("show_page"):
+                    c.showPage()
+            progress.page_done(done, total)
+    # Pages and forms are only encoded when the document is written
+    with _stage(progress, metrics, "save"), reportlab_output(metrics):
+        c.save()
+
+
+_worker_cancel = None
+
+
+def _init_worker(cancel_event):
+    global _worker_cancel
+    _worker_cancel = cancel_event
+
+
+def _render_chunk(config, start, stop, trace_allocations=None):
+    # trace_allocations is None when the parent is not collecting metrics
+    buf = io.BytesIO()
+    cancelled = _worker_cancel.is_set if _worker_cancel else None
+    metrics = NULL_METRICS if trace_allocations is None else Metrics(trace_allocations)
+    register_fonts(config.fonts)
+    render_pages(config, buf, range(start, stop), cancelled, metrics=metrics)
+    if metrics is NULL_METRICS:
+        return buf.getvalue(), None
+    metrics.close()
+    return buf.getvalue(), metrics.to_dict()
+
+
+def render_parallel(config, output, workers, cancelled=None, progress=NULL_PROGRESS,
+                    chunk_size=None, metrics=NULL_METRICS):
+    # Render page ranges in worker processes and merge them in page order
+    count = config.page_count
+    chunk_size = chunk_size or max(1, math.ceil(count / workers))
+    bounds = [(start, min(start + chunk_size, count)) for start in range(0, count, chunk_size)]
+
+    writer = PdfWriter()
+    # spawn keeps workers independent of the (possibly Tk-owning) parent
+    context = multiprocessing.get_context("spawn")
+    cancel_event = context.Event()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(cancel_event,)) as pool:
+        trace = None if metrics is NULL_METRICS else metrics.trace_allocations
+        futures = [pool.submit(_render_chunk, config, start, stop, trace) for start, stop in bounds]
+        with _stage(progress, metrics, "pages"):
+            try:
+                for future, (_, stop) in zip(futures, bounds):
+                    # Poll so a cancel request reaches running chunks within a page
+                    while not wait([future], timeout=0.1).done:
+                        _check_cancelled(cancelled)
+                    _check_cancelled(cancelled)
+                    data, chunk_metrics = future.result()
+                    writer.append(PdfReader(io.BytesIO(data)))
+                    if chunk_metrics:
+                        # Worker stages become chunk_draw_page, chunk_save, ...
+                        metrics.merge(chunk_metrics, prefix="chunk_")
+                    progress.page_done(stop, count)
+            except RenderCancelled:
+                cancel_event.set()
+                for pending in futures:
+                    pending.cancel()
+                raise
+
+    with _stage(progress, metrics, "merge"):
+        # Every chunk carries its own copy of the page template and fonts;
+        # collapse identical objects so shared resources are stored once. Each
+        # pass only merges objects whose children are already shared, so repeat
+        # for the depth of the resource tree (font dict -> form -> page resources).
+        for _ in range(3):
+            writer.compress_identical_objects()
+    with _stage(progress, metrics, "save"):
+        writer.write(output)
+
+
+def render_streaming(config, output, cancelled=None, progress=NULL_PROGRESS, pattern=False,
+                     metrics=NULL_METRICS):
+    # Write each page to disk as soon as it is finished; memory stays flat
+    # Interiors do not bleed: the page, trim and bleed boxes are one
+    box = layout_for(config).trim_box
+    coords = " ".join("%.4f" % v for v in box)
+    boxes = "/TrimBox [%s] /BleedBox [%s] " % (coords, coords)
+    with StreamingPDFWriter(output) as writer:
+        with _stage(progress, metrics, "template"):
+            resources = "<< >>"
+            content = ""
+            tiling = tiling_pattern(config) if pattern else None
+            if tiling:
+                # One pattern cell, one fill per page: no per-primitive content at all
+                cell, step, matrix, (rx0, ry0, rx1, ry1) = tiling
+                pat = writer.add_pattern(cell, step, matrix)
+                resources = "<< /Pattern << /Ruling %d 0 R >> >>" % pat
+                content = "/Pattern cs /Ruling scn %.2f %.2f %.2f %.2f re f" % (
+                    rx0, ry0, rx1 - rx0, ry1 - ry0)
+            elif config.page_style != "blank":
+                form = writer.add_form(ruling_operators(config), box)
+                resources = "<< /XObject << /Tpl %d 0 R >> >>" % form
+                content = "/Tpl Do"
+        with _stage(progress, metrics, "pages"):
+            for page in range(config.page_count):
+                _check_cancelled(cancelled)
+                with metrics.timed("page_seconds"), metrics.stage("write_page"):
+                    writer.add_page(content, box, resources, boxes)
+                progress.page_done(page + 1, config.page_count)
+
+
+def render_book(config, output=None, cancelled=None, workers=1, streaming=False,
+                pattern=False, progress=None, metrics=None):
+    """Render the interior for config; the cover is a separate PDF (kdp.wrap).
+
+    output may be a path or a binary file object; when omitted the PDF bytes
+    are returned. workers > 1 renders page ranges in parallel processes;
+    streaming=True writes pages out as they are produced for constant memory
+    use. pattern=True fills the live area with a native tiling pattern; it is
+    only available on the streaming writer and implies streaming=True.
+
+    progress is an optional ProgressChannel that receives per-page progress
+    and stage timings. Cancellation (the cancelled callable, or the channel's
+    cancel()) is checked once per page; it raises RenderCancelled and removes
+    any partial output file.
+
+    metrics is an optional kdp.metrics.Metrics that records wall time, CPU
+    time and (if enabled) allocations for each stage, down to every page.
+
+    Raises ValueError if KDP does not accept config.page_count for its trim
+    size and interior.
+    """
+    check_page_count(config)
+    if progress is not None and cancelled is None:
+        cancelled = progress.cancelled
+    progress = progress or NULL_PROGRESS
+    metrics = metrics or NULL_METRICS
+    target = io.BytesIO() if output is None else output
+    register_fonts(config.fonts)
+    try:
+        if streaming or pattern:
+            render_streaming(config, target, cancelled, progress, pattern, metrics)
+        elif workers > 1 and config.page_count > 1:
+            if PdfWriter is None:
+                logging.warning("pypdf is not installed; rendering on a single core")
+                render_pages(config, target, range(config.page_count), cancelled, progress,
+                             metrics)
+            else:
+                render_parallel(config, target, workers, cancelled, progress, metrics=metrics)
+        else:
+            render_pages(config, target, range(config.page_count), cancelled, progress, metrics)
+    except RenderCancelled:
+        if isinstance(output, (str, os.PathLike)) and os.path.exists(output):
+            os.remove(output)
+        raise
+    return target.getvalue() if output is None else output
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    workers = 1
+    metrics_file = None
+    streaming = "--stream" in argv
+    pattern = "--pattern" in argv
+    allocations = "--allocations" in argv
+    argv = [arg for arg in argv if arg not in ("--stream", "--pattern", "--allocations")]
+    if "--workers" in argv:
+        i = argv.index("--workers")
+        workers = int(argv[i + 1])
+        argv = argv[:i] + argv[i + 2:]
+    if "--metrics" in argv:
+        i = argv.index("--metrics")
+        metrics_file = argv[i + 1]
+        argv = argv[:i] + argv[i + 2:]
+    if len(argv) != 2:
+        print("usage: python -m kdp.render SPEC.json OUTPUT.pdf "
+              "[--workers N | --stream | --pattern] [--metrics FILE.json|FILE.prom [--allocations]]",
+              file=sys.stderr)
+        return 2
+    metrics = Metrics(allocations) if metrics_file else None
+    with open(argv[0]) as f:
+        config = BookConfig.from_dict(json.load(f))
+    try:
+        render_book(config, argv[1], workers=workers, streaming=streaming, pattern=pattern,
+                    metrics=metrics)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if metrics:
+        metrics.close()
+        metrics.write(metrics_file)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
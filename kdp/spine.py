@@ -0,0 +1,140 @@
+"""
+Paperback spine width, full-wrap cover size and page-count limits.
+
+Spine width is the page count times the paper thickness of the interior
+type; the full-wrap cover is back + spine + front plus bleed on every
+side. Page-count limits depend on the interior type and whether the trim
+is a regular (up to 7 x 10 in) or large size. The tables (paper
+thickness in kdp.config.INTERIORS, page limits here) follow KDP's published
+paperback specifications; update them when KDP does.
+
+The array functions take whole columns (page counts, interior types, trim
+sizes) so a catalogue of thousands of manifest rows is computed in a
+handful of NumPy operations:
+
+    python -m kdp.spine manifest.csv > spines.csv
+"""
+
+import csv
+import sys
+
+import numpy as np
+from reportlab.lib.units import inch
+
+from .config import INTERIORS
+
+# (min, max) pages per interior, in INTERIORS order, for regular / large trims
+_LIMITS = np.array([
+    [(24, 828), (24, 776), (72, 600), (24, 828)],  # regular: up to 7 x 10 in
+    [(24, 590), (24, 550), (72, 600), (24, 590)],  # large
+])
+REGULAR_TRIM_MAX = (7.0, 10.0)  # inches, short side x long side
+SPINE_TEXT_MIN_PAGES = 80  # KDP only allows spine text above 79 pages
+SPINE_TEXT_MARGIN = 0.0625  # inches clear of each spine fold
+
+_NAMES = tuple(INTERIORS)
+_THICKNESS = np.array([thickness for _, thickness in INTERIORS.values()])
+
+
+def interior_codes(interiors):
+    # Interior names -> row indices into the tables above
+    names, inverse = np.unique(np.asarray(interiors, dtype=str), return_inverse=True)
+    unknown = [name for name in names if name not in INTERIORS]
+    if unknown:
+        raise ValueError(f"Unknown interior type(s): {', '.join(unknown)}; "
+                         f"expected one of {', '.join(_NAMES)}")
+    return np.array([_NAMES.index(name) for name in names], dtype=np.intp)[inverse]
+
+
+def spine_widths(page_counts, interiors):
+    """Spine width in inches for each (page count, interior) pair."""
+    return np.asarray(page_counts, dtype=float) * _THICKNESS[interior_codes(interiors)]
+
+
+def page_limits(trim_widths, trim_heights, interiors):
+    """(min_pages, max_pages) arrays for each trim (inches) and interior."""
+    w, h = np.asarray(trim_widths, dtype=float), np.asarray(trim_heights, dtype=float)
+    large = ((np.minimum(w, h) > REGULAR_TRIM_MAX[0])
+             | (np.maximum(w, h) > REGULAR_TRIM_MAX[1])).astype(np.intp)
+    limits = _LIMITS[large, interior_codes(interiors)]
+    return limits[..., 0], limits[..., 1]
+
+
+def cover_dimensions(page_counts, interiors, trim_widths, trim_heights, bleed=0.125):
+    """Full-wrap cover (width, height, spine) in inches, each an array."""
+    spine = spine_widths(page_counts, interiors)
+    width = 2 * np.asarray(trim_widths, dtype=float) + spine + 2 * bleed
+    height = np.asarray(trim_heights, dtype=float) + 2 * bleed
+    return width, height, spine
+
+
+def spine_table(configs):
+    """Column arrays for a sequence of BookConfigs, one row per book."""
+    trims = np.array([config.page_size for config in configs], dtype=float).reshape(-1, 2) / inch
+    pages = np.array([config.page_count for config in configs], dtype=np.int64)
+    interiors = [config.interior for config in configs]
+    bleed = np.array([config.bleed for config in configs], dtype=float)
+
+    width, height, spine = cover_dimensions(pages, interiors, trims[:, 0], trims[:, 1], bleed)
+    low, high = page_limits(trims[:, 0], trims[:, 1], interiors)
+    return {
+        "page_count": pages,
+        "spine": spine,
+        "cover_width": width,
+        "cover_height": height,
+        "min_pages": low,
+        "max_pages": high,
+        "valid": (pages >= low) & (pages <= high),
+        "spine_text": pages >= SPINE_TEXT_MIN_PAGES,
+    }
+
+
+def spine_width(config):
+    return float(spine_widths([config.page_count], [config.interior])[0])
+
+
+def cover_size(config):
+    # Full-wrap cover (width, height) in inches for one book
+    width, height = config.page_size
+    cover_w, cover_h, _ = cover_dimensions([config.page_count], [config.interior],
+                                           [width / inch], [height / inch], config.bleed)
+    return float(cover_w[0]), float(cover_h[0])
+
+
+def check_page_count(config):
+    width, height = config.page_size
+    low, high = page_limits([width / inch], [height / inch], [config.interior])
+    low, high = int(low[0]), int(high[0])
+    if not low <= config.page_count <= high:
+        raise ValueError(f"{INTERIORS[config.interior][0]} books at {config.trim_size} "
+                         f"must have {low}-{high} pages, not {config.page_count}")
+    return low, high
+
+
+def main(argv=None):
+    from .batch import load_manifest
+
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("usage: python -m kdp.spine MANIFEST.csv|json", file=sys.stderr)
+        return 2
+
+    jobs = load_manifest(argv[0])
+    for job in jobs:
+        if job.config is None:
+            print(job.error, file=sys.stderr)
+    configs = [job.config for job in jobs if job.config is not None]
+    table = spine_table(configs)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["title", "trim_size", "interior", "page_count", "spine_in",
+                     "cover_width_in", "cover_height_in", "spine_text", "valid"])
+    for i, config in enumerate(configs):
+        writer.writerow([config.title, config.trim_size, config.interior, config.page_count,
+                         f"{table['spine'][i]:.4f}", f"{table['cover_width'][i]:.4f}",
+                         f"{table['cover_height'][i]:.4f}", bool(table["spine_text"][i]),
+                         bool(table["valid"][i])])
+    return 0 if table["valid"].all() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+Full-wrap paperback cover PDFs.
+
+KDP takes the cover as its own PDF: back cover, spine and front cover side
+by side on one page, with bleed on every outer edge. render_cover() lays
+that out for a BookConfig, with the spine width from kdp.spine:
+
+- the uploaded cover image fills the front panel, or the whole wrap when
+  its aspect ratio says it was designed as one;
+- title and author are fitted onto the front and, from
+  SPINE_TEXT_MIN_PAGES pages up, the spine (full-wrap artwork is assumed to
+  carry its own text);
+- the ISBN barcode goes in KDP's barcode area on the back.
+
+Font sizes are fitted by binary search. Word widths are measured once per
+(word, font) at 1 pt and scaled, so fitting a whole series of covers that
+share words and fonts hardly touches reportlab's metrics.
+
+    python -m kdp.wrap spec.json cover.pdf
+"""
+
+import io
+import json
+import logging
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import getAscentDescent, stringWidth
+from reportlab.pdfgen import canvas
+
+from .config import BookConfig
+from .covers import PRINT_DPI, artwork_size, cover_image
+from .fonts import register_fonts
+from .isbn import barcode_operators, draw_barcode, normalize
+from .metrics import NULL_METRICS
+from .render import reportlab_output
+from .spine import SPINE_TEXT_MARGIN, SPINE_TEXT_MIN_PAGES, cover_size, spine_width
+
+LEADING = 1.2  # line height as a multiple of the font size
+MIN_FONT_SIZE = 6
+MAX_FONT_SIZE = 72
+FRONT_MARGIN = 0.5 * inch  # text inset from the front cover's trim edges
+SPINE_END_MARGIN = 0.375 * inch  # spine text clear of the top and bottom trim
+# KDP's barcode area: bottom right of the back cover, clear of trim and spine
+BARCODE_AREA = (2 * inch, 1.2 * inch)
+BARCODE_OFFSET = 0.25 * inch
+
+
+@dataclass(frozen=True, slots=True)
+class CoverLayout:
+    # All values in points; panels are (x0, y0, x1, y1) trim boxes on the wrap
+    width: float
+    height: float
+    bleed: float
+    back: tuple
+    spine: tuple
+    front: tuple
+
+
+def cover_layout(config):
+    width, height = (v * inch for v in cover_size(config))
+    bleed = config.bleed * inch
+    trim_w = config.page_size[0]
+    spine = spine_width(config) * inch
+    y0, y1 = bleed, height - bleed
+    return CoverLayout(
+        width=width,
+        height=height,
+        bleed=bleed,
+        back=(bleed, y0, bleed + trim_w, y1),
+        spine=(bleed + trim_w, y0, bleed + trim_w + spine, y1),
+        front=(bleed + trim_w + spine, y0, width - bleed, y1),
+    )
+
+
+@lru_cache(maxsize=16384)
+def unit_width(text, font):
+    # Width of text at 1 pt; widths scale linearly with the font size
+    return stringWidth(text, font, 1)
+
+
+def wrap_words(words, font, size, width):
+    # Greedy line breaking on cached word widths
+    space = unit_width(" ", font) * size
+    lines, line, used = [], [], 0.0
+    for word in words:
+        w = unit_width(word, font) * size
+        if line and used + space + w > width:
+            lines.append(" ".join(line))
+            line, used = [], 0.0
+        used += (space if line else 0.0) + w
+        line.append(word)
+    if line:
+        lines.append(" ".join(line))
+    return lines
+
+
+@lru_cache(maxsize=1024)
+def fit_text(text, font, width, height, max_size=MAX_FONT_SIZE, max_lines=None,
+             min_size=MIN_FONT_SIZE):
+    """Largest size, in half points, at which text wraps into width x height.
+
+    Returns (size, lines). Text that does not fit even at min_size is
+    returned at min_size and will overflow its box.
+    """
+    words = tuple(text.split())
+    if not words:
+        return min_size, ()
+    widest = max(unit_width(word, font) for word in words)
+
+    def fits(size):
+        if widest * size > width:
+            return False
+        count = len(wrap_words(words, font, size, width))
+        return (max_lines is None or count <= max_lines) and size * (LEADING * (count - 1) + 1) <= height
+
+    # More text per line only ever needs more lines, so fits() is monotonic in size
+    lo, hi = round(min_size * 2), round(max_size * 2)
+    if not fits(lo / 2):
+        logging.warning(f"'{text}' does not fit {width:.0f}x{height:.0f} pt at {min_size} pt")
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if fits(mid / 2):
+            lo = mid
+        else:
+            hi = mid - 1
+    size = lo / 2
+    return size, tuple(wrap_words(words, font, size, width))
+
+
+def draw_text_block(c, lines, font, size, x0, x1, top):
+    # Centred lines hanging from top
+    c.setFont(font, size)
+    y = top - size
+    for line in lines:
+        c.drawCentredString((x0 + x1) / 2, y, line)
+        y -= size * LEADING
+
+
+def draw_artwork(c, config, layout):
+    """Draw the uploaded cover; returns True if it covers the whole wrap."""
+    if not config.cover_path:
+        return False
+    # Anchored at the top right: the front cover ends at the outer bleed edge
+    (width, height), full_wrap = artwork_size(config.cover_path, config)
+    size = round(width * PRINT_DPI), round(height * PRINT_DPI)
+    image = cover_image(config.cover_path, size, config.color_mode, config.cmyk_profile)
+    width, height = width * inch, height * inch
+    c.drawImage(image, layout.width - width, layout.height - height, width, height)
+    return full_wrap
+
+
+def draw_front_text(c, config, layout, font):
+    x0, y0, x1, y1 = layout.front
+    x0, x1, top = x0 + FRONT_MARGIN, x1 - FRONT_MARGIN, y1 - FRONT_MARGIN
+    height = y1 - y0 - 2 * FRONT_MARGIN
+    c.setFillGray(0)
+    if config.title:
+        size, lines = fit_text(config.title, font, x1 - x0, height * 0.4)
+        draw_text_block(c, lines, font, size, x0, x1, top)
+    if config.author:
+        size, lines = fit_text(config.author, font, x1 - x0, height * 0.15, max_size=36)
+        block = size * (LEADING * (len(lines) - 1) + 1)
+        draw_text_block(c, lines, font, size, x0, x1, y0 + FRONT_MARGIN + block)
+
+
+def draw_spine_text(c, config, layout, font):
+    if config.page_count < SPINE_TEXT_MIN_PAGES:
+        return
+    parts = [part for part in (config.title, config.author) if part]
+    x0, y0, x1, y1 = layout.spine
+    thickness = x1 - x0 - 2 * SPINE_TEXT_MARGIN * inch
+    length = y1 - y0 - 2 * SPINE_END_MARGIN
+    if not parts or thickness <= 0:
+        return
+    # Title and author share one size; keep a tenth of the length between them.
+    # Ascender to descender must fit across the spine
+    ascent, descent = getAscentDescent(font, 1)
+    size, _ = fit_text(" ".join(parts), font, length * (0.9 if len(parts) > 1 else 1.0),
+                       thickness / (ascent - descent), max_lines=1,
+                       min_size=min(MIN_FONT_SIZE, thickness))
+    c.saveState()
+    # Spine text reads top to bottom, centred across the spine
+    c.translate((x0 + x1) / 2, (y0 + y1) / 2)
+    c.rotate(-90)
+    c.setFillGray(0)
+    c.setFont(font, size)
+    baseline = -(ascent + descent) / 2 * size
+    if len(parts) == 1:
+        c.drawCentredString(0, baseline, parts[0])
+    else:
+        c.drawString(-length / 2, baseline, parts[0])
+        c.drawRightString(length / 2, baseline, parts[1])
+    c.restoreState()
+
+
+def draw_isbn_barcode(c, config, layout, font):
+    x1, y0 = layout.back[2] - BARCODE_OFFSET, layout.back[1] + BARCODE_OFFSET
+    area_w, area_h = BARCODE_AREA
+    _, (_, _, width, height) = barcode_operators(normalize(config.isbn))
+    # Shrink the symbol to the area; EAN-13 allows magnifications down to 80%
+    scale = min(1.0, area_w / width, area_h / height)
+    c.setFillGray(1)
+    c.rect(x1 - area_w, y0, area_w, area_h, stroke=0, fill=1)
+    c.saveState()
+    c.translate(x1 - (area_w + width * scale) / 2, y0 + (area_h - height * scale) / 2)
+    c.scale(scale, scale)
+    draw_barcode(c, config.isbn, 0, 0, font_name=font)
+    c.restoreState()
+
+
+def render_cover(config, output=None, metrics=None):
+    """Render the full-wrap cover for config.
+
+    output may be a path or a binary file object; when omitted the PDF
+    bytes are returned. Text, including the barcode digits, is set in
+    config.cover_font and embedded. metrics is an optional
+    kdp.metrics.Metrics; image preparation, text (including loading the
+    font) and the barcode are recorded as separate stages.
+    """
+    metrics = metrics or NULL_METRICS
+    font = config.cover_font
+    register_fonts([(font, config.cover_font_path)])
+    layout = cover_layout(config)
+    bleed = layout.bleed
+    target = io.BytesIO() if output is None else output
+    c = canvas.Canvas(target, pagesize=(layout.width, layout.height),
+                      trimBox=(bleed, bleed, layout.width - bleed, layout.height - bleed),
+                      bleedBox=(0, 0, layout.width, layout.height),
+                      initialFontName=font)  # else reportlab lists non-embedded Helvetica
+    c.setTitle(config.title)
+    c.setAuthor(config.author)
+    # drawImage() encodes the artwork straight away, so the output settings
+    # cover drawing as well as saving
+    with reportlab_output(metrics):
+        with metrics.stage("cover_prep"):
+            full_wrap = draw_artwork(c, config, layout)
+        if not full_wrap:
+            with metrics.stage("cover_text"):
+                draw_front_text(c, config, layout, font)
+                draw_spine_text(c, config, layout, font)
+        if config.isbn:
+            with metrics.stage("barcode"):
+                draw_isbn_barcode(c, config, layout, font)
+        with metrics.stage("cover_save"):
+            c.showPage()
+            c.save()
+    return target.getvalue() if output is None else output
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("usage: python -m kdp.wrap SPEC.json OUTPUT.pdf", file=sys.stderr)
+        return 2
+    with open(argv[0]) as f:
+        config = BookConfig.from_dict(json.load(f))
+    render_cover(config, argv[1])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
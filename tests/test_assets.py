@@ -0,0 +1,119 @@
+import io
+import struct
+
+import pytest
+from PIL import Image, ImageCms
+
+from kdp.assets import inspect_image, inspect_images
+from kdp.covers import passthrough_ok
+
+
+def encode(fmt, **params):
+    buffer = io.BytesIO()
+    Image.new("RGB", (120, 80), "red").save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+@pytest.fixture(params=[("JPEG", ".jpg", {"dpi": (300, 300)}),
+                        ("PNG", ".png", {"dpi": (300, 300)}),
+                        ("TIFF", ".tif", {"dpi": (300, 300)})],
+                ids=["jpeg", "png", "tiff"])
+def image(request, tmp_path):
+    fmt, suffix, params = request.param
+    return fmt, tmp_path / f"cover{suffix}", encode(fmt, **params)
+
+
+def test_reads_header(image):
+    fmt, path, data = image
+    path.write_bytes(data)
+    info = inspect_image(str(path))
+    assert (info.format, info.width, info.height, info.mode) == (fmt, 120, 80, "RGB")
+    assert info.dpi == (300, 300)
+
+
+@pytest.mark.parametrize("keep", [9, 12, 16, 24, 40])
+def test_truncated_raises_value_error(image, keep):
+    _, path, data = image
+    path.write_bytes(data[:keep])
+    with pytest.raises(ValueError):
+        inspect_image(str(path))
+
+
+def test_corrupt_jpeg_segment_length(tmp_path):
+    path = tmp_path / "cover.jpg"
+    path.write_bytes(b"\xff\xd8\xff\xe0\x00\x00" + b"\0" * 32)
+    with pytest.raises(ValueError):
+        inspect_image(str(path))
+
+
+def test_corrupt_jpeg_marker(tmp_path):
+    path = tmp_path / "cover.jpg"
+    path.write_bytes(b"\xff\xd8JFIF" + b"\0" * 32)
+    with pytest.raises(ValueError):
+        inspect_image(str(path))
+
+
+def test_corrupt_png_ihdr(tmp_path):
+    path = tmp_path / "cover.png"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n" + struct.pack(">I4s", 13, b"IHDR") + b"\0" * 5)
+    with pytest.raises(ValueError):
+        inspect_image(str(path))
+
+
+def test_corrupt_tiff_ifd_offset(tmp_path):
+    path = tmp_path / "cover.tif"
+    path.write_bytes(b"II*\0" + struct.pack("<I", 1 << 20))
+    with pytest.raises(ValueError):
+        inspect_image(str(path))
+
+
+def test_unsupported_format(tmp_path):
+    path = tmp_path / "cover.gif"
+    path.write_bytes(encode("GIF"))
+    with pytest.raises(ValueError, match="Unsupported"):
+        inspect_image(str(path))
+
+
+def test_inspect_images_reports_errors(image):
+    _, path, data = image
+    path.write_bytes(data[:16])
+    (result,) = inspect_images([str(path)]).values()
+    assert isinstance(result, str)
+
+
+def test_passthrough_rejects_truncated_jpeg(tmp_path):
+    path = tmp_path / "cover.jpg"
+    path.write_bytes(encode("JPEG")[:12])
+    assert passthrough_ok(str(path), (120, 80)) is False
+
+
+def strip_segment(data, marker):
+    # Drop every JPEG header segment with the given APPn marker byte
+    out, i = bytearray(data[:2]), 2
+    while data[i + 1] != 0xDA:  # start of scan
+        (length,) = struct.unpack(">H", data[i + 2:i + 4])
+        if data[i + 1] != marker:
+            out += data[i:i + 2 + length]
+        i += 2 + length
+    return bytes(out + data[i:])
+
+
+def test_passthrough_cmyk_needs_adobe_marker(tmp_path):
+    buffer = io.BytesIO()
+    Image.new("CMYK", (120, 80), (0, 50, 100, 0)).save(buffer, "JPEG")
+    path = tmp_path / "cover.jpg"
+    path.write_bytes(buffer.getvalue())
+    assert passthrough_ok(str(path), (120, 80), "CMYK") is True
+    path.write_bytes(strip_segment(buffer.getvalue(), 0xEE))
+    assert passthrough_ok(str(path), (120, 80), "CMYK") is False
+
+
+def test_passthrough_rgb_needs_srgb_profile(tmp_path):
+    srgb = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+    # Same profile under another name stands in for Adobe RGB and the like
+    wide = srgb.replace("sRGB".encode("utf-16-be"), "Wide".encode("utf-16-be"))
+    path = tmp_path / "cover.jpg"
+    path.write_bytes(encode("JPEG", icc_profile=srgb))
+    assert passthrough_ok(str(path), (120, 80)) is True
+    path.write_bytes(encode("JPEG", icc_profile=wide))
+    assert passthrough_ok(str(path), (120, 80)) is False
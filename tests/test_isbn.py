@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from kdp.config import BookConfig
+from kdp.isbn import (Ranges, assign_isbns, check_digits, hyphenate, isbn_block, normalize,
+                      validate)
+
+# Excerpt of ISBN International's RangeMessage.xml, in its format
+RANGE_MESSAGE = """<?xml version="1.0" encoding="utf-8"?>
+<ISBNRangeMessage>
+  <EAN.UCCPrefixes>
+    <EAN.UCC><Prefix>978</Prefix><Rules>
+      <Rule><Range>0000000-5999999</Range><Length>1</Length></Rule>
+      <Rule><Range>6000000-6499999</Range><Length>3</Length></Rule>
+    </Rules></EAN.UCC>
+    <EAN.UCC><Prefix>979</Prefix><Rules>
+      <Rule><Range>8000000-8999999</Range><Length>1</Length></Rule>
+    </Rules></EAN.UCC>
+  </EAN.UCCPrefixes>
+  <RegistrationGroups>
+    <Group><Prefix>978-0</Prefix><Rules>
+      <Rule><Range>0000000-1999999</Range><Length>2</Length></Rule>
+      <Rule><Range>2000000-2279999</Range><Length>3</Length></Rule>
+      <Rule><Range>2280000-2289999</Range><Length>4</Length></Rule>
+      <Rule><Range>2290000-6999999</Range><Length>3</Length></Rule>
+    </Rules></Group>
+    <Group><Prefix>978-1</Prefix><Rules>
+      <Rule><Range>7000000-7319999</Range><Length>5</Length></Rule>
+      <Rule><Range>7320000-7399999</Range><Length>7</Length></Rule>
+      <Rule><Range>7400000-7999999</Range><Length>0</Length></Rule>
+    </Rules></Group>
+  </RegistrationGroups>
+</ISBNRangeMessage>
+"""
+
+
+@pytest.fixture
+def ranges(tmp_path):
+    path = tmp_path / "RangeMessage.xml"
+    path.write_text(RANGE_MESSAGE)
+    return Ranges.from_xml(str(path))
+
+
+@pytest.mark.parametrize("body, check", [("978030640615", 7), ("978173312340", 2),
+                                         ("979888000000", 5), ("978022800000", 6)])
+def test_check_digits(body, check):
+    assert check_digits(np.frombuffer(body.encode(), np.uint8) - 48) == check
+
+
+def test_validate():
+    assert validate(["978-0-306-40615-7", "9780306406158", "9770306406157", "97803064"]).tolist() \
+        == [True, False, False, False]
+
+
+def test_normalize_converts_isbn10():
+    assert normalize("0-306-40615-2") == "9780306406157"
+    assert normalize("978 0 306 40615 7") == "9780306406157"
+    with pytest.raises(ValueError):
+        normalize("0-306-40615-3")
+
+
+@pytest.mark.parametrize("isbn, expected", [
+    ("9781733123402", "978-1-7331234-0-2"),
+    ("9781700000002", "978-1-70000-000-2"),
+    ("9780228000006", "978-0-2280-0000-6"),
+    ("9780306406157", "978-0-306-40615-7"),
+])
+def test_hyphenate(ranges, isbn, expected):
+    assert hyphenate([isbn], ranges) == [expected]
+
+
+@pytest.mark.parametrize("isbn", [
+    "9798880000005",  # no registrant rules for the group
+    "9781740000000",  # unassigned registrant range
+    "9786000000004",  # no registrant rules for 978-600
+])
+def test_unknown_ranges_stay_unhyphenated(ranges, isbn):
+    assert hyphenate([isbn], ranges) == [isbn]
+
+
+def test_no_range_data_leaves_isbns_unhyphenated():
+    assert hyphenate(["978-1-7331234-0-2"], Ranges({}, {})) == ["9781733123402"]
+
+
+def test_hyphenate_rejects_invalid(ranges):
+    with pytest.raises(ValueError, match="9781733123403"):
+        hyphenate(["9781733123402", "9781733123403"], ranges)
+
+
+def test_isbn_block():
+    block = isbn_block("978-1-7331234", count=3)
+    assert block.tolist() == ["9781733123402", "9781733123419", "9781733123426"]
+    assert validate(isbn_block("979-8-88", count=500)).all()
+    with pytest.raises(ValueError):
+        isbn_block("978-1-7331234", count=11)
+
+
+def test_assign_isbns_skips_used():
+    configs = [BookConfig(isbn="9781733123402"), BookConfig(), BookConfig()]
+    assigned = assign_isbns(configs, "978-1-7331234")
+    assert [config.isbn for config in assigned] == ["9781733123402", "9781733123419",
+                                                    "9781733123426"]
@@ -0,0 +1,36 @@
+import pytest
+from reportlab.pdfgen import canvas
+
+from kdp.config import BookConfig
+from kdp.wrap import cover_layout, render_cover
+
+preflight_pdf = pytest.importorskip("kdp.preflight").preflight_pdf  # needs pypdf
+
+
+@pytest.mark.parametrize("page_count", [40, 300])
+def test_rendered_cover_passes(tmp_path, page_count):
+    config = BookConfig(title="Field Notes", author="A. Writer", isbn="9780306406157",
+                        page_count=page_count)
+    path = str(tmp_path / "cover.pdf")
+    render_cover(config, path)
+    report = preflight_pdf(path, config, workers=1, cache_dir=None, cover=True)
+    assert report.summary() == []
+
+
+def test_cover_checks_fonts_and_safe_zones(tmp_path):
+    config = BookConfig(page_count=300)
+    layout = cover_layout(config)
+    bleed = layout.bleed
+    path = str(tmp_path / "cover.pdf")
+    c = canvas.Canvas(path, pagesize=(layout.width, layout.height),
+                      trimBox=(bleed, bleed, layout.width - bleed, layout.height - bleed),
+                      bleedBox=(0, 0, layout.width, layout.height))
+    c.setFont("Helvetica", 12)
+    c.drawString(layout.spine[0], layout.height / 2, "Title")  # on the spine fold
+    c.save()
+    issues = preflight_pdf(path, config, workers=1, cache_dir=None, cover=True).summary()
+    assert any("Helvetica is not embedded" in issue for issue in issues)
+    assert any("outside the safe zones" in issue for issue in issues)
+    # Checked as an interior, the same file fails on its page count and boxes
+    interior = preflight_pdf(path, config, workers=1, cache_dir=None).summary()
+    assert any("Page count" in issue for issue in interior)